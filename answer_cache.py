@@ -0,0 +1,139 @@
+# answer_cache.py
+"""Semantic cache of generated answers: exact question match, then nearest neighbour"""
+
+import os
+import re
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+import numpy as np
+
+from cache_backend import CacheBackend, shared_cache
+from embedding_cache import normalise_query
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "2000"))              # paraphrase index per namespace
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))  # cosine for a paraphrase hit
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", str(24 * 3600)))      # seconds
+
+_NUMBERS = re.compile(r"\d+")
+
+
+class _Namespace:
+    """Paraphrase index for one (school, pipeline, language) and KB version"""
+
+    def __init__(self, version: str):
+        self.version = version
+        self.vectors: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None
+        self._keys: list = []
+
+    def matrix(self) -> Tuple[list, Optional[np.ndarray]]:
+        # Rebuilt lazily after inserts; lookups far outnumber inserts
+        if self._matrix is None:
+            self._keys = list(self.vectors)
+            self._matrix = np.stack([self.vectors[k] for k in self._keys]) if self._keys else None
+        return self._keys, self._matrix
+
+    def add(self, question: str, vec: np.ndarray, max_entries: int) -> None:
+        self.vectors[question] = vec
+        self.vectors.move_to_end(question)
+        while len(self.vectors) > max_entries:
+            self.vectors.popitem(last=False)
+        self._matrix = None
+
+
+class AnswerCache:
+    """Answers keyed by normalised question, with a paraphrase fallback.
+
+    Answers live in the "answers" namespace of the shared cache backend, so
+    exact repeats hit across workers. lookup() then tries the cached
+    question whose embedding is closest to the query vector, if it clears
+    threshold and mentions the same numbers ("Year 7 fees" never answers
+    "Year 9 fees"); that index holds the questions this worker has stored
+    or served. Keys include the KB version, so a reload starts fresh.
+    Callers must not cache answers shaped by conversation history or
+    family details.
+    """
+
+    NAMESPACE = "answers"
+
+    def __init__(self, max_entries: int = ANSWER_CACHE_SIZE, threshold: float = ANSWER_CACHE_THRESHOLD,
+                 backend: Optional[CacheBackend] = None, ttl: Optional[float] = ANSWER_CACHE_TTL):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl = ttl
+        self._backend = backend
+        self._namespaces: Dict[Tuple[Hashable, ...], _Namespace] = {}
+        self._lock = threading.Lock()
+        self.semantic_hits = 0
+
+    @property
+    def backend(self) -> CacheBackend:
+        return self._backend or shared_cache()
+
+    @staticmethod
+    def _unit(q_vec: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        if q_vec is None:
+            return None
+        q = np.asarray(q_vec, dtype=np.float32)
+        return q / max(float(np.linalg.norm(q)), 1e-10)
+
+    @staticmethod
+    def _key(namespace: Tuple[Hashable, ...], version: str, question: str) -> str:
+        raw = json.dumps([list(namespace), version, question], ensure_ascii=False)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _index(self, namespace: Tuple[Hashable, ...], version: str) -> _Namespace:
+        ns = self._namespaces.get(namespace)
+        if ns is None or ns.version != version:
+            ns = self._namespaces[namespace] = _Namespace(version)
+        return ns
+
+    def lookup(self, namespace: Tuple[Hashable, ...], version: str, question: str,
+               q_vec: Optional[np.ndarray] = None) -> Optional[Dict[str, Any]]:
+        question = normalise_query(question)
+        q = self._unit(q_vec)
+        value = self.backend.get_json(self.NAMESPACE, self._key(namespace, version, question))
+        with self._lock:
+            ns = self._index(namespace, version)
+            if value is not None:
+                if q is not None:
+                    ns.add(question, q, self.max_entries)
+                return value
+            keys, matrix = ns.matrix()
+        if q is None or matrix is None or matrix.shape[1] != q.shape[0]:
+            return None
+
+        sims = matrix @ q
+        numbers = _NUMBERS.findall(question)
+        for i in np.argsort(-sims):
+            if sims[i] < self.threshold:
+                break
+            if _NUMBERS.findall(keys[i]) != numbers:
+                continue
+            value = self.backend.get_json(self.NAMESPACE, self._key(namespace, version, keys[i]))
+            if value is not None:
+                print(f"🧠 Answer cache paraphrase hit ({sims[i]:.3f}): '{keys[i]}'")
+                with self._lock:
+                    self.semantic_hits += 1
+                return value
+        return None
+
+    def store(self, namespace: Tuple[Hashable, ...], version: str, question: str,
+              q_vec: Optional[np.ndarray], value: Dict[str, Any]) -> None:
+        question = normalise_query(question)
+        self.backend.set_json(self.NAMESPACE, self._key(namespace, version, question), value, ttl=self.ttl)
+        q = self._unit(q_vec)
+        if q is not None:
+            with self._lock:
+                self._index(namespace, version).add(question, q, self.max_entries)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self.backend.stats().get(self.NAMESPACE, {}))
+        with self._lock:
+            stats["semantic_hits"] = self.semantic_hits
+            stats["paraphrase_index"] = sum(len(ns.vectors) for ns in self._namespaces.values())
+        return stats
@@ -4,10 +4,10 @@
 import os
 import re
 import json
+import time
 import uuid
-import pickle
 import hashlib
-import difflib
+import threading
 from datetime import datetime, date
 from typing import Optional, Dict, Any, List
 
@@ -15,12 +15,26 @@ import numpy as np
 import requests
 from bs4 import BeautifulSoup
 from dateutil import parser as dateparse
-from flask import Flask, request, jsonify, send_from_directory, session, redirect
+from flask import Flask, request, jsonify, send_from_directory, session, redirect, g, has_request_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 from openai import OpenAI
 from flask import make_response
 
+from knowledge_base import KnowledgeBase
+from school_registry import School, SchoolRegistry, UnknownSchool, load_school_configs, DEFAULT_SCHOOL
+from knowledge_index import MMR_POOL_FACTOR
+from lexical_index import reciprocal_rank_scores
+from context_builder import RAG_MIN_SCORE, build_context
+from embedding_cache import EmbeddingCache, normalise_query
+from embedding_backends import EMBEDDING_BACKEND, get_backend
+from answer_cache import AnswerCache
+from single_flight import SingleFlight
+from cache_warmup import WarmupElection, WarmupQuestion, load_warmup_questions, record_question, warm_caches
+from cache_backend import CACHE_BACKEND, configure_shared_cache, make_cache_backend, shared_cache
+from static_qa_index import normalise_variant
+from chunk_store import DOC_TYPES
+
 # Gmail API imports
 import base64
 from email.mime.text import MIMEText
@@ -44,6 +58,7 @@ EMAIL_FROM = os.getenv("EMAIL_FROM", "More House CRM <bob.ottley@morehousemail.o
 # Booking App & Prospectus App URLs
 BOOKING_APP_URL = os.getenv("BOOKING_APP_URL", "http://localhost:3002")
 PROSPECTUS_APP_URL = os.getenv("PROSPECTUS_APP_URL", "http://localhost:3000")
+BOOKING_HTTP = requests.Session()  # keeps the TLS connection to the booking app alive between requests
 
 
 # ── Boot ──────────────────────────────────────────────────────────────────
@@ -57,7 +72,6 @@ client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
 GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
 GOOGLE_REDIRECT_URI = os.getenv("GOOGLE_REDIRECT_URI", "http://localhost:5000/auth/callback")
-ADMISSIONS_EMAIL = os.getenv("ADMISSIONS_EMAIL", "office@morehousemail.org.uk")
 
 GMAIL_SCOPES = [
     'https://www.googleapis.com/auth/gmail.send',
@@ -82,11 +96,15 @@ CORS(app, resources={
     r"/*": {
         "origins": "*",
         "methods": ["GET", "POST", "OPTIONS"],
-        "allow_headers": ["Content-Type"],
+        "allow_headers": ["Content-Type", "X-School-Id"],
         "supports_credentials": False
     }
 })
 
+@app.errorhandler(UnknownSchool)
+def unknown_school(e):
+    return jsonify({"ok": False, "error": f"Unknown school: {e.args[0]}"}), 404
+
 # ── Conversation Memory Store ────────────────────────────────────────────
 conversation_memory = {}  # In production, use Redis or similar
 
@@ -111,12 +129,75 @@ else:
     if not DATABASE_URL:
         print("⚠️ DATABASE_URL not set. Family context endpoints will be disabled.")
 
-# ── Knowledge base (embeddings already prepared) ────────────────────────
-with open("kb_chunks/kb_chunks.pkl", "rb") as f:
-    kb_chunks = pickle.load(f)
+# ── Shared cache ─────────────────────────────────────────────────────────
+# Embeddings, answers, translations and booking events all store into one
+# namespaced backend. "memory" is private to each gunicorn worker; "sqlite"
+# (CACHE_PATH) is shared by the workers on a host and "postgres" (db_pool)
+# by every host, each with a small per-worker LRU in front.
+try:
+    configure_shared_cache(make_cache_backend(CACHE_BACKEND, pool=db_pool))
+except Exception as e:
+    print(f"⚠️ Cache backend '{CACHE_BACKEND}' unavailable, using in-process memory: {e}")
+    configure_shared_cache(make_cache_backend("memory"))
+
+# ── Embedding function ───────────────────────────────────────────────────
+EMBED_TIMEOUT = float(os.getenv("EMBED_TIMEOUT_SECONDS", "5"))
+
+# Repeat questions ("what are the fees?") skip the embeddings round trip;
+# CACHE_BACKEND=sqlite|postgres shares vectors across workers and restarts
+# EMBEDDING_BACKEND=local embeds queries offline; the KB must then be
+# built with the same backend (see embedding_backends.py)
+EMBED_BACKEND = (get_backend(client=client, timeout=EMBED_TIMEOUT) if EMBEDDING_BACKEND == "openai"
+                 else get_backend())
+EMBED_CACHE = EmbeddingCache(model=EMBED_BACKEND.model, dimensions=EMBED_BACKEND.dimensions)
+
+def embed_text(text: str) -> np.ndarray:
+    """Embedding of text. A failure is remembered for the rest of the request,
+    so the paraphrase lookups and the search don't each wait out EMBED_TIMEOUT"""
+    failures = g.setdefault("embed_failures", {}) if has_request_context() else {}
+    if text in failures:
+        raise failures[text]
+    try:
+        return EMBED_CACHE.get_or_embed(text, EMBED_BACKEND.embed_one)
+    except Exception as e:
+        failures[text] = e
+        raise
+
+def embed_texts(texts: List[str]) -> np.ndarray:
+    """Embed a batch of texts with at most one API call; rows follow the input order"""
+    return EMBED_CACHE.get_or_embed_many(texts, EMBED_BACKEND.embed)
 
-EMBEDDINGS = np.array([chunk["embedding"] for chunk in kb_chunks], dtype=np.float32)
-METADATA = kb_chunks
+# ── Knowledge base (embeddings already prepared) ────────────────────────
+# Each school (tenant) has its own KB, static Q&A table and prompts, loaded
+# on first request by SCHOOLS and evicted LRU-first beyond the memory
+# budget. KBs prefer the memory-mapped binary format (see
+# convert_kb_to_binary.py) so gunicorn workers share one copy of the
+# vectors. Handlers call current_kb() once and use that snapshot, so a hot
+# reload (admin endpoint or KB_WATCH_INTERVAL watcher) never mixes indices
+# from two builds.
+KB_QUANTISATION = os.getenv("KB_QUANTISATION", "none")  # none | int8 (binary KB only)
+KB_WATCH_INTERVAL = float(os.getenv("KB_WATCH_INTERVAL", "0"))  # seconds; 0 disables
+KB_RELOAD_SECRET = os.getenv("KB_RELOAD_SECRET", os.getenv("OPEN_DAYS_REFRESH_SECRET", "change-me"))
+SCHOOL_MEMORY_BUDGET_MB = int(os.getenv("SCHOOL_MEMORY_BUDGET_MB", "1024"))
+
+SCHOOLS = SchoolRegistry(
+    load_school_configs(os.getenv("SCHOOLS_CONFIG")),
+    default=os.getenv("DEFAULT_SCHOOL", DEFAULT_SCHOOL),
+    memory_budget=SCHOOL_MEMORY_BUDGET_MB * 1024 * 1024,
+    quantisation=KB_QUANTISATION,
+    watch_interval=KB_WATCH_INTERVAL,
+    embedding_model=EMBED_BACKEND.model,
+    embedding_dimensions=EMBED_BACKEND.dimensions,
+)
+SCHOOLS.get()  # load the default school at boot
+
+def request_school(data: Optional[Dict[str, Any]] = None) -> School:
+    """School selected by the request: JSON 'school', X-School-Id header or ?school="""
+    key = (data or {}).get('school') or request.headers.get('X-School-Id') or request.args.get('school')
+    return SCHOOLS.get(key)
+
+def current_kb(school: Optional[School] = None) -> KnowledgeBase:
+    return (school or SCHOOLS.get()).kb
 
 # ── Conversation Intelligence ────────────────────────────────────────────
 class ConversationTracker:
@@ -313,22 +394,244 @@ def safe_trim(v: Any, limit: int = 120) -> str:
     s = str(v).strip()
     return (s if len(s) <= limit else s[:limit] + "…")
 
-# ── Embedding function ───────────────────────────────────────────────────
-def embed_text(text: str) -> np.ndarray:
-    resp = client.embeddings.create(
-        model="text-embedding-3-small",
-        input=text.strip()
-    )
-    return np.array(resp.data[0].embedding, dtype=np.float32)
-
 # ── Vector search ────────────────────────────────────────────────────────
-def vector_search(query: str, k: int = 10):
-    q_vec = embed_text(query)
-    norm_q = np.linalg.norm(q_vec) + 1e-10
-    norms = np.linalg.norm(EMBEDDINGS, axis=1) + 1e-10
-    sims = (EMBEDDINGS @ q_vec) / (norms * norm_q)
-    idxs = np.argsort(sims)[::-1][:k]
-    return sims, idxs
+KB_SEARCH_MODE = os.getenv("KB_SEARCH_MODE", "hybrid")  # hybrid | vector | lexical
+# Hits carry cosine scores even when BM25 found them, so the context
+# builder's cosine floor only applies when retrieval is vector-only
+CONTEXT_MIN_SCORE = RAG_MIN_SCORE if KB_SEARCH_MODE == "vector" else 0.0
+RRF_DEPTH = 50  # candidates taken from each ranking before fusion
+
+def vector_search(query: str, k: int = 10, exact: bool = False, nprobe: Optional[int] = None,
+                  mode: Optional[str] = None, filters: Optional[Dict[str, str]] = None,
+                  kb: Optional[KnowledgeBase] = None, diverse: bool = False,
+                  q_vec: Optional[np.ndarray] = None):
+    """Return (scores, idxs) for the k best chunks; scores[i] belongs to idxs[i].
+
+    "hybrid" fuses the vector and BM25 rankings with reciprocal-rank fusion
+    and reports cosine scores for the fused hits; "vector" is embeddings
+    only; "lexical" is BM25 only and needs no embeddings call. If embedding
+    the query fails or times out, the search runs the same way against the
+    KB's local n-gram index (build_local_index.py), or falls back to lexical
+    with BM25 scores when there is none.
+
+    Large KBs are searched through the IVF index; exact=True forces brute
+    force and nprobe trades recall for speed on the IVF path.
+
+    filters may set source_prefix ("/admissions/"), doc_type ("pdf" or
+    "html") and label; matching rows come from masks memoised on the chunks.
+
+    diverse=True re-picks the hits from a wider pool by maximal marginal
+    relevance, so near-duplicate passages from repeated page sections give
+    way to different ones (or are dropped). Use it when filling a prompt.
+
+    Pass the caller's kb snapshot so idxs index the same kb.chunks it reads,
+    and q_vec if the caller already embedded query (see query_vector).
+    """
+    kb = kb or current_kb()
+    rows = kb.chunks.filter_rows(**filters) if filters else None
+    if rows is not None and len(rows) == 0:
+        return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+
+    mode = mode or KB_SEARCH_MODE
+    if mode == "lexical":
+        return kb.lexical.search(query, k, rows=rows)
+    index = kb.index
+    if q_vec is None:
+        index, q_vecs = _query_vectors(kb, [query])
+        if index is None:
+            return kb.lexical.search(query, k, rows=rows)
+        q_vec = q_vecs[0]
+    return _search_embedded(kb, index, query, q_vec, k, mode, rows=rows, exact=exact, nprobe=nprobe,
+                            diverse=diverse)
+
+def _query_vectors(kb: KnowledgeBase, queries: List[str]):
+    """(index, query vectors) to search kb with: kb.index and the embeddings,
+    or the local index and its vectors if embedding fails; (None, None) if
+    it fails and kb has no local index"""
+    try:
+        if len(queries) == 1:
+            return kb.index, np.atleast_2d(embed_text(queries[0]))
+        return kb.index, embed_texts(queries)
+    except Exception as e:
+        if kb.local is None:
+            print(f"⚠️ Query embedding failed, using lexical search: {e}")
+            return None, None
+        print(f"⚠️ Query embedding failed, using the local index: {e}")
+        return kb.local.index, np.array([kb.local.embed_query(q) for q in queries], dtype=np.float32)
+
+def _search_depth(k: int, mode: str, diverse: bool) -> int:
+    """How many vector hits _search_embedded ranks from"""
+    pool = k * MMR_POOL_FACTOR if diverse else k
+    return pool if mode == "vector" else max(pool, RRF_DEPTH)
+
+def _search_embedded(kb: KnowledgeBase, index, query: str, q_vec: np.ndarray, k: int, mode: str,
+                     rows: Optional[np.ndarray] = None, exact: bool = False, nprobe: Optional[int] = None,
+                     diverse: bool = False, ranked=None):
+    """vector_search once query is embedded; ranked is the caller's
+    index.search(q_vec, _search_depth(...), rows=rows), if it has it"""
+    pool = k * MMR_POOL_FACTOR if diverse else k
+    if ranked is None:
+        ranked = index.search(q_vec, _search_depth(k, mode, diverse), nprobe=nprobe, exact=exact, rows=rows)
+    scores, idxs = ranked
+    relevance = None  # MMR ranks by cosine unless the hits were fused
+    if mode != "vector":
+        scores, idxs, relevance = _fuse_with_lexical(kb, query, q_vec, idxs, pool, rows, index=index)
+    if diverse:
+        return index.mmr(q_vec, idxs, k, relevance=relevance)
+    return scores, idxs
+
+def _fuse_with_lexical(kb: KnowledgeBase, query: str, q_vec: np.ndarray, vec_idxs: np.ndarray, k: int,
+                       rows: Optional[np.ndarray] = None, index=None):
+    """(cosine scores, idxs, fused relevance) of the RRF top k; relevance is
+    the RRF score scaled so the top hit is 1.0, for MMR to keep BM25's picks"""
+    _, lex_idxs = kb.lexical.search(query, max(k, RRF_DEPTH), rows=rows)
+    idxs, fused = reciprocal_rank_scores([vec_idxs, lex_idxs])
+    idxs, fused = idxs[:k], fused[:k]
+    relevance = fused / fused[0] if len(fused) else fused
+    return (index or kb.index).score_rows(q_vec, idxs), idxs, relevance
+
+def vector_search_many(queries: List[str], k: int = 10, mode: Optional[str] = None,
+                       filters: Optional[List[Optional[Dict[str, str]]]] = None,
+                       kb: Optional[KnowledgeBase] = None, diverse: bool = False):
+    """vector_search for several queries: one embeddings call, and one matmul
+    for the queries without filters.
+
+    filters, if given, holds a filter dict (or None) per query. Falls back
+    as vector_search does when embedding fails. Returns a list of
+    (scores, idxs) pairs in the order of queries.
+    """
+    if not queries:
+        return []
+    kb = kb or current_kb()
+    mode = mode or KB_SEARCH_MODE
+    filters = filters or [None] * len(queries)
+    index, q_vecs = _query_vectors(kb, queries) if mode != "lexical" else (None, None)
+    if index is None:
+        return [vector_search(query, k, mode="lexical", filters=query_filters, kb=kb)
+                for query, query_filters in zip(queries, filters)]
+
+    unfiltered = [i for i, query_filters in enumerate(filters) if not query_filters]
+    ranked = {}
+    if unfiltered:
+        ranked = dict(zip(unfiltered, index.search_many(q_vecs[unfiltered], _search_depth(k, mode, diverse))))
+    results = []
+    for i, (query, query_filters) in enumerate(zip(queries, filters)):
+        rows = kb.chunks.filter_rows(**query_filters) if query_filters else None
+        if rows is not None and len(rows) == 0:
+            results.append((np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)))
+            continue
+        results.append(_search_embedded(kb, index, query, q_vecs[i], k, mode, rows=rows, diverse=diverse,
+                                        ranked=ranked.get(i)))
+    return results
+
+# Topics that should ALWAYS use AI knowledge base for rich, detailed answers
+# (not just redirect to pages); these are also the suggestion-button queries
+AI_ONLY_TOPICS = [
+    'pastoral care', 'safeguarding', 'learning support', 'academic life',
+    'subjects', 'results', 'inspection', 'sixth form',
+    'sport', 'co-curricular', 'faith life', 'facilities',
+    'location', 'transport', 'term dates', 'uniform', 'lunch menu',
+    'ethos', 'calendar', 'policies', 'virtual tour',
+    'fees', 'bursaries', 'scholarships',  # Use AI for detailed fees info
+    'admissions', 'entry points', 'registration deadlines'  # Use AI for admissions details
+]
+# Matched the way static Q&A variants are, so "Fees?" and "co curricular" count
+AI_ONLY_TOPIC_KEYS = {normalise_variant(topic): topic for topic in AI_ONLY_TOPICS}
+
+# Site sections to search first when the topic is already known
+TOPIC_FILTERS = {
+    'fees': {'source_prefix': '/admissions/'},
+    'bursaries': {'source_prefix': '/admissions/'},
+    'scholarships': {'source_prefix': '/admissions/'},
+    'admissions': {'source_prefix': '/admissions/'},
+    'entry points': {'source_prefix': '/admissions/'},
+    'registration deadlines': {'source_prefix': '/admissions/'},
+    'policies': {'source_prefix': '/information/school-policies/'},
+    'safeguarding': {'source_prefix': '/information/school-policies/'},
+}
+
+def filtered_search(query: str, k: int = 10, filters: Optional[Dict[str, str]] = None,
+                    kb: Optional[KnowledgeBase] = None, diverse: bool = False,
+                    q_vec: Optional[np.ndarray] = None):
+    """vector_search narrowed by filters, widening to the whole KB if nothing matches"""
+    kb = kb or current_kb()
+    if filters:
+        scores, idxs = vector_search(query, k, filters=filters, kb=kb, diverse=diverse, q_vec=q_vec)
+        if len(idxs) > 0:
+            return scores, idxs
+        print(f"↩️  No hits for filters {filters}, searching the whole knowledge base")
+    return vector_search(query, k, kb=kb, diverse=diverse, q_vec=q_vec)
+
+# ── Answer cache ─────────────────────────────────────────────────────────
+# Generated RAG answers, reused for repeat and paraphrased questions against
+# the same KB version. Only answers not shaped by conversation history or
+# family details are stored.
+ANSWER_CACHE = AnswerCache()
+
+def query_vector(question: str) -> Optional[np.ndarray]:
+    """Query vector for paraphrase lookups (answer cache, semantic static
+    Q&A), to pass on to the search; None in lexical mode or if embedding
+    failed, in which case embed_text fails fast for the search too"""
+    if KB_SEARCH_MODE == "lexical":
+        return None
+    try:
+        return embed_text(question)
+    except Exception as e:
+        print(f"⚠️ Query embedding failed, paraphrase matching disabled for this question: {e}")
+        return None
+
+# Identical questions arriving together (a newsletter link, a popular
+# button) wait for the first one's answer instead of each calling the LLM.
+# Gunicorn's sync workers serve one request each, so this only reaches
+# across workers through a shared CACHE_BACKEND (sqlite or postgres)
+ANSWER_FLIGHTS = SingleFlight()
+
+def lookup_answer(answer_ns: tuple, version: str, question: str,
+                  q_vec: Optional[np.ndarray]) -> "tuple[Optional[Dict[str, Any]], Optional[tuple]]":
+    """(cached answer, None), or (None, flight key) when this request should generate it.
+
+    On a miss, concurrent requests for the same question queue behind one
+    leader and re-check the cache once it finishes. The caller must pass
+    the flight key to ANSWER_FLIGHTS.finish() once the answer is stored
+    (or has failed). Only for answers that are safe to share.
+    """
+    key = answer_ns + (version, normalise_query(question))
+    for _ in range(2):
+        cached = ANSWER_CACHE.lookup(answer_ns, version, question, q_vec)
+        if cached is not None:
+            return cached, None
+        if ANSWER_FLIGHTS.lead(key):
+            return None, key
+    # The leaders before us produced nothing cacheable; answer independently
+    return ANSWER_CACHE.lookup(answer_ns, version, question, q_vec), None
+
+@app.teardown_request
+def _finish_answer_flight(exc):
+    ANSWER_FLIGHTS.finish(g.pop("answer_flight", None))
+
+# ── Booking app events ───────────────────────────────────────────────────
+BOOKING_EVENTS_TTL = float(os.getenv("BOOKING_EVENTS_TTL", "300"))  # seconds
+
+def fetch_booking_events(school_id: Optional[int], event_type: str = "open_day") -> Optional[Any]:
+    """Published events from the booking app, cached briefly; None if it didn't answer OK"""
+    key = f"{school_id}:{event_type}"
+    cached = shared_cache().get_json("booking_events", key)
+    if cached is not None:
+        return cached
+    response = BOOKING_HTTP.get(
+        f"{BOOKING_APP_URL}/api/events",
+        params={
+            "schoolId": school_id,
+            "eventType": event_type,
+            "status": "published"
+        },
+        timeout=10
+    )
+    if not response.ok:
+        return None
+    events = response.json()
+    shared_cache().set_json("booking_events", key, events, ttl=BOOKING_EVENTS_TTL)
+    return events
 
 # ── DB helpers ───────────────────────────────────────────────────────────
 def fetch_family_context(family_id: str) -> Optional[Dict[str, Any]]:
@@ -406,9 +709,8 @@ def log_interaction_to_db(family_id: str, question: str, answer: str, metadata:
         print(f"Failed to log interaction: {e}")
 
 # ── Enhanced Answer Logic ────────────────────────────────────────────────
-from static_qa_config import STATIC_QA_LIST as STATIC_QAS
 from contextualButtons import get_suggestions
-from language_engine import translate
+from language_engine import translate, warm_up as warm_up_translation
 
 response_enhancer = ResponseEnhancer()
 
@@ -427,7 +729,8 @@ def get_open_day_events():
         print("⚠️ Could not read open days cache:", e)
         return []
 
-def find_best_answer(question, language='en', session_id=None, family_id=None):
+def find_best_answer(question, language='en', session_id=None, family_id=None, school=None):
+    school = school or SCHOOLS.get()
     q_lower = question.strip().lower()
     print(f"🧠 Processing: {q_lower} | Lang: {language} | Session: {session_id}")
 
@@ -458,37 +761,23 @@ def find_best_answer(question, language='en', session_id=None, family_id=None):
         tracker = ConversationTracker(str(uuid.uuid4()), family_id)
 
     # Static exact match
-    for qa in STATIC_QAS:
-        if qa['language'] != language:
-            continue
-        variants = [qa['key']] + qa.get('variants', [])
-        if q_lower in [v.lower() for v in variants]:
-            print(f"✅ Exact match on: {qa['key']}")
-            answer = qa['answer']
-            
-            # Track interaction
-            tracker.add_interaction(question, answer, qa['key'])
-            
-            # Enhance for voice
-            if session_id:  # Only enhance for voice sessions
-                family_ctx = fetch_family_context(family_id) if family_id else None
-                answer = response_enhancer.enhance_for_voice(answer, tracker, family_ctx)
-                
-            return answer, qa.get('url'), qa.get('label'), qa['key'], "static"
+    qa = school.static_index.lookup(language, question)
+    if qa is not None:
+        print(f"✅ Exact match on: {qa['key']}")
+        answer = qa['answer']
+
+        # Track interaction
+        tracker.add_interaction(question, answer, qa['key'])
+
+        # Enhance for voice
+        if session_id:  # Only enhance for voice sessions
+            family_ctx = fetch_family_context(family_id) if family_id else None
+            answer = response_enhancer.enhance_for_voice(answer, tracker, family_ctx)
+
+        return answer, qa.get('url'), qa.get('label'), qa['key'], "static"
 
     # Fuzzy static match
-    best_score = 0
-    best_match = None
-    for qa in STATIC_QAS:
-        if qa['language'] != language:
-            continue
-        variants = [qa['key']] + qa.get('variants', [])
-        for var in variants:
-            score = difflib.SequenceMatcher(None, q_lower, var.lower()).ratio()
-            if score > best_score:
-                best_score = score
-                best_match = qa
-                
+    best_match, best_score = school.fuzzy.best(language, question.strip())
     if best_match and best_score > 0.8:
         print(f"🟡 Fuzzy match on: {best_match['key']} (score {best_score:.2f})")
         answer = best_match['answer']
@@ -503,37 +792,72 @@ def find_best_answer(question, language='en', session_id=None, family_id=None):
             
         return answer, best_match.get('url'), best_match.get('label'), best_match['key'], "fuzzy"
 
+    # Semantic static match: a paraphrase of a curated question, recognised
+    # from the query embedding the RAG search below would compute anyway
+    q_vec = query_vector(question)
+    if school.static_vectors is not None:
+        semantic_match, semantic_score = school.static_vectors.match(language, q_vec)
+        if semantic_match:
+            print(f"🟢 Semantic match on: {semantic_match['key']} (cos {semantic_score:.2f})")
+            answer = semantic_match['answer']
+            tracker.add_interaction(question, answer, semantic_match['key'])
+            if session_id:
+                family_ctx = fetch_family_context(family_id) if family_id else None
+                answer = response_enhancer.enhance_for_voice(answer, tracker, family_ctx)
+            return answer, semantic_match.get('url'), semantic_match.get('label'), semantic_match['key'], "semantic"
+
     # RAG fallback with GPT summarisation
-    sims, idxs = vector_search(question)
-    if len(idxs) > 0:
-        print(f"🔵 Vector match (cos={sims[idxs[0]]:.2f})")
-        contexts = [METADATA[i].get("text", "") for i in idxs[:10]]
-        
-        # Build conversation-aware prompt
-        conversation_context = ""
-        if tracker and len(tracker.interactions) > 0:
-            recent = tracker.interactions[-3:]  # Last 3 interactions
-            conversation_context = "Previous context: " + " | ".join([f"Q: {i['question'][:50]}" for i in recent])
-        
-        prompt = (
-            f"{conversation_context}\n\n" if conversation_context else ""
-        ) + (
-            "Use ONLY the passages below to answer.\n\n"
-            + "\n---\n".join(contexts)
-            + f"\n\nQuestion: {question}\nAnswer:"
-        )
-        
-        chat = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a warm, helpful British school assistant. Be conversational."},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.3,
-        )
-        raw = chat.choices[0].message.content
-        clean = format_response(remove_bullets(raw))
-        
+    kb = current_kb(school)
+    # Prompts that include earlier turns give answers only this parent should see
+    personalised = bool(tracker and tracker.interactions)
+    answer_ns = (school.key, "rag", language)
+    entry, flight = None, None
+    if not personalised:
+        entry, flight = lookup_answer(answer_ns, kb.version, question, q_vec)
+        if entry is not None:
+            print("⚡ Answer cache hit")
+    try:
+        if entry is None:
+            scores, idxs = vector_search(question, kb=kb, diverse=True, q_vec=q_vec)
+        if entry is None and len(idxs) > 0:
+            print(f"🔵 Vector match (cos={scores[0]:.2f})")
+            contexts = build_context(kb.chunks, scores, idxs, question, min_score=CONTEXT_MIN_SCORE)
+
+            # Build conversation-aware prompt
+            conversation_context = ""
+            if personalised:
+                recent = tracker.interactions[-3:]  # Last 3 interactions
+                conversation_context = "Previous context: " + " | ".join([f"Q: {i['question'][:50]}" for i in recent])
+
+            prompt = (
+                f"{conversation_context}\n\n" if conversation_context else ""
+            ) + (
+                "Use ONLY the passages below to answer.\n\n"
+                + "\n---\n".join(contexts)
+                + f"\n\nQuestion: {question}\nAnswer:"
+            )
+
+            chat = client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[
+                    {"role": "system", "content": school.prompt("rag_system")},
+                    {"role": "user", "content": prompt},
+                ],
+                temperature=0.3,
+            )
+            raw = chat.choices[0].message.content
+            clean = format_response(remove_bullets(raw))
+            meta = kb.chunks[idxs[0]]
+            url, label = meta.get('url'), meta.get('label') or "View document"
+            entry = {"answer": clean, "url": url, "label": label}
+            if not personalised:
+                ANSWER_CACHE.store(answer_ns, kb.version, question, q_vec, entry)
+    finally:
+        ANSWER_FLIGHTS.finish(flight)
+
+    if entry is not None:
+        clean, url, label = entry["answer"], entry["url"], entry["label"]
+
         # Track interaction
         tracker.add_interaction(question, clean, "general")
         
@@ -549,8 +873,7 @@ def find_best_answer(question, language='en', session_id=None, family_id=None):
             except Exception as e:
                 print("Translate error:", e)
 
-        meta = METADATA[idxs[0]]
-        return clean, meta.get('url'), meta.get('label') or "View document", None, "rag"
+        return clean, url, label, None, "rag"
 
     # No match
     print("❌ No suitable match found.")
@@ -623,6 +946,44 @@ def refresh_open_days():
     _write_cache(payload)
     return jsonify({"ok": True, "count": len(events)})
 
+@app.route("/tasks/reload-kb", methods=["POST"])
+def reload_kb():
+    """Reload the knowledge base in this worker if its files changed.
+
+    Each gunicorn worker holds its own KB reference, so for a fleet-wide
+    reload set KB_WATCH_INTERVAL and let every worker's watcher pick it up.
+    """
+    if request.headers.get("X-Refresh-Secret") != KB_RELOAD_SECRET:
+        return jsonify({"ok": False, "error": "unauthorised"}), 401
+    data = request.get_json(silent=True) or {}
+    school = request_school(data)
+    try:
+        swapped = school.kb_holder.reload(force=bool(data.get("force")))
+    except Exception as e:
+        print(f"❌ KB reload failed for {school.key}: {e}")
+        return jsonify({"ok": False, "error": str(e), "version": school.kb_holder.version}), 500
+    kb = current_kb(school)
+    return jsonify({"ok": True, "school": school.key, "swapped": swapped, "version": kb.version, "chunks": len(kb)})
+
+@app.route("/tasks/cache-stats", methods=["GET"])
+def cache_stats():
+    """Per-namespace entries (shared) and hit/miss counters (this worker)"""
+    if request.headers.get("X-Refresh-Secret") != KB_RELOAD_SECRET:
+        return jsonify({"ok": False, "error": "unauthorised"}), 401
+    cache = shared_cache()
+    return jsonify({"ok": True, "pid": os.getpid(), "backend": cache.name,
+                    "namespaces": cache.stats(), "answers": ANSWER_CACHE.stats(),
+                    "flights": ANSWER_FLIGHTS.stats()})
+
+@app.route("/tasks/cache-flush", methods=["POST"])
+def cache_flush():
+    """Drop one cache namespace ({"namespace": "answers"}), or everything if none is given"""
+    if request.headers.get("X-Refresh-Secret") != KB_RELOAD_SECRET:
+        return jsonify({"ok": False, "error": "unauthorised"}), 401
+    namespace = (request.get_json(silent=True) or {}).get("namespace")
+    removed = shared_cache().flush(namespace)
+    return jsonify({"ok": True, "namespace": namespace, "removed": removed})
+
 @app.route("/open-days", methods=["GET"])
 def get_open_days():
     return jsonify(_read_cache())
@@ -743,7 +1104,7 @@ def auth_status():
     """Check Gmail authentication status"""
     return jsonify({
         "authenticated": session.get('google_authenticated', False),
-        "email_configured": ADMISSIONS_EMAIL
+        "email_configured": request_school().admissions_email
     })
 
 @app.route("/auth/logout")
@@ -843,11 +1204,19 @@ def realtime_tool_kb_search():
             "ok": False,
             "error": "No query provided"
         }), 400
+    if data.get('doc_type') and data['doc_type'] not in DOC_TYPES:
+        return jsonify({
+            "ok": False,
+            "error": f"doc_type must be one of {', '.join(DOC_TYPES)}"
+        }), 400
 
     try:
         # Perform vector search on knowledge base
         print(f"🔍 Voice KB search: {query}")
-        sims, idxs = vector_search(query, k=5)  # Get top 5 results
+        filters = {key: data[key] for key in ('source_prefix', 'doc_type', 'label') if data.get(key)}
+        school = request_school(data)
+        kb = current_kb(school)
+        scores, idxs = filtered_search(query, k=5, filters=filters, kb=kb, diverse=True)  # Get top 5 results
 
         if len(idxs) == 0:
             return jsonify({
@@ -857,7 +1226,7 @@ def realtime_tool_kb_search():
             })
 
         # Get the most relevant chunks
-        contexts = [METADATA[i].get("text", "") for i in idxs[:5]]
+        contexts = build_context(kb.chunks, scores, idxs, query, min_score=CONTEXT_MIN_SCORE, max_chunks=5)
 
         # Build a concise answer using GPT
         prompt = (
@@ -869,7 +1238,7 @@ def realtime_tool_kb_search():
         chat = client.chat.completions.create(
             model="gpt-4o-mini",
             messages=[
-                {"role": "system", "content": "You are a helpful British school assistant. Be concise and conversational. Use British English."},
+                {"role": "system", "content": school.prompt("voice_kb_system")},
                 {"role": "user", "content": prompt},
             ],
             temperature=0.3,
@@ -879,7 +1248,7 @@ def realtime_tool_kb_search():
         answer = chat.choices[0].message.content.strip()
 
         # Get metadata for reference
-        meta = METADATA[idxs[0]]
+        meta = kb.chunks[idxs[0]]
 
         print(f"✅ KB answer: {answer[:100]}...")
 
@@ -888,7 +1257,7 @@ def realtime_tool_kb_search():
             "answer": answer,
             "source": "knowledge_base",
             "url": meta.get('url'),
-            "similarity": float(sims[idxs[0]])
+            "similarity": float(scores[0])
         })
 
     except Exception as e:
@@ -904,6 +1273,9 @@ def realtime_tool_kb_search():
 def realtime_tool_book_staff_meeting():
     """Book staff meeting tool for realtime voice sessions"""
     data = request.json or {}
+    school = request_school(data)
+    if not school.admissions_email:
+        return jsonify({"ok": False, "error": f"Meeting requests are not set up for {school.name}"}), 400
 
     parent_name = data.get('parent_name', '').strip()
     parent_email = data.get('parent_email', '').strip()
@@ -926,7 +1298,7 @@ def realtime_tool_book_staff_meeting():
         body_html = f"""
         <html>
           <body style="font-family: Arial, sans-serif;">
-            <h2 style="color: #091825;">Meeting Request - More House School</h2>
+            <h2 style="color: #091825;">Meeting Request - {school.name}</h2>
 
             <table style="border-collapse: collapse; width: 100%; max-width: 600px;">
               <tr>
@@ -960,7 +1332,7 @@ def realtime_tool_book_staff_meeting():
             </p>
 
             <p style="color: #666; font-size: 12px; margin-top: 30px;">
-              <em>This meeting request was sent via Emily Voice, the More House AI assistant.</em>
+              <em>This meeting request was sent via Emily Voice, the {school.name} AI assistant.</em>
             </p>
           </body>
         </html>
@@ -968,14 +1340,14 @@ def realtime_tool_book_staff_meeting():
 
         # Send email
         success, result_msg = send_email_via_gmail(
-            to_email=ADMISSIONS_EMAIL,
+            to_email=school.admissions_email,
             cc_email=parent_email,
             subject=subject,
             body_html=body_html
         )
 
         if success:
-            print(f"✅ Voice meeting request email sent to {ADMISSIONS_EMAIL}")
+            print(f"✅ Voice meeting request email sent to {school.admissions_email}")
             return jsonify({
                 "ok": True,
                 "message": f"Meeting request submitted successfully. The school office will contact you to confirm a time."
@@ -999,10 +1371,13 @@ def realtime_tool_book_staff_meeting():
 @app.route('/ask', methods=['POST'])
 def ask():
     data = request.json or {}
+    school = request_school(data)
     question = data.get('question', '')
     language = data.get('language', 'en')
     family_id = data.get('family_id')
     session_id = data.get('session_id') or str(uuid.uuid4())
+    if question and not is_warmup_request():
+        record_question(school.key, language, question, request.path)
 
     # Check if question is asking for open day dates (informational query, not booking)
     q_lower = question.lower().strip('?!.,')
@@ -1055,19 +1430,9 @@ def ask():
         print(f"✅ MATCH! Fetching real open day dates from database...")
         # Fetch actual open day events
         try:
-            import requests
             # Call booking app directly instead of calling ourselves
-            response = requests.get(
-                f"{BOOKING_APP_URL}/api/events",
-                params={
-                    "schoolId": 2,  # More House
-                    "eventType": "open_day",
-                    "status": "published"
-                },
-                timeout=10
-            )
-            if response.ok:
-                events_data = response.json()
+            events_data = fetch_booking_events(school.booking_school_id)
+            if events_data is not None:
                 # Parse ISO format date properly
                 today = date.today()
                 events = []
@@ -1117,7 +1482,7 @@ def ask():
             # Fall through to normal answer
 
     answer, url, label, matched_key, source = find_best_answer(
-        question, language, session_id, family_id
+        question, language, session_id, family_id, school=school
     )
 
     # Log to database for admissions dashboard
@@ -1128,11 +1493,13 @@ def ask():
             'topic': matched_key,
             'sentiment': tracker.emotional_state if tracker else 'neutral',
             'session_id': session_id,
-            'high_intent': tracker.high_intent_signals > 0 if tracker else False
+            'high_intent': tracker.high_intent_signals > 0 if tracker else False,
+            'school': school.key,
+            'language': language,
         }
         log_interaction_to_db(family_id, question, answer, metadata)
 
-    suggestions = get_suggestions(matched_key or question, language=language)
+    suggestions = get_suggestions(matched_key or question, language=language, qa_list=school.static_qas, matcher=school.fuzzy)
     queries = [s['query'] for s in suggestions]
     query_map = {s['query']: s['label'] for s in suggestions}
 
@@ -1160,10 +1527,72 @@ def _format_button_suggestions(suggestions):
     query_map = {s['query']: s['label'] for s in suggestions}
     return queries, query_map
 
+def tools_system_prompt(school: School, language: str, contexts: List[str],
+                        family_ctx: Optional[Dict[str, Any]] = None) -> str:
+    """System prompt for /ask-with-tools: knowledge base passages, rules and actions"""
+    system_prompt = f"""You are Emily, the AI assistant for {school.name}.
+Be warm, helpful, and professional. Use British spelling.
+Language: {language}
+
+CRITICAL: You must ONLY use information from the provided knowledge base passages below.
+DO NOT use any external knowledge or make assumptions beyond what is explicitly stated in these passages.
+If the answer is not in the passages, say you don't have that specific information.
+
+FORMATTING RULES:
+- DO NOT use markdown formatting (no **, __, *, etc.)
+- Use plain text only
+- For lists, use simple dashes or numbers
+- Separate sections with blank lines, not with bold headings
+- Keep formatting clean and simple for text display
+
+KNOWLEDGE BASE:
+---
+{chr(10).join(['---' + chr(10) + ctx for ctx in contexts])}
+---
+
+CONVERSATION MEMORY:
+You have access to the conversation history. Use it to remember:
+- What the parent asked for in previous messages
+- Information they've already provided (name, email, phone, etc.)
+- The context of the current conversation
+DO NOT ask for information the parent has already provided in earlier messages.
+
+AVAILABLE ACTIONS:
+You can help parents in the following ways:
+1. Book tours and visits - use the send_enquiry_email function
+2. Book meetings with staff members - use the book_staff_meeting function when they want to meet with specific staff (registrar, head, bursar, etc.)
+3. Answer questions about the school using only the knowledge base provided
+
+When a parent wants to book a meeting with a staff member:
+- First, note which staff member they want to meet and why (from their request)
+- Ask for any missing information: name, email, phone, AND their availability/preferred times
+- Example: "Could you please provide your full name, email, phone number, and some times that work for you (e.g., weekday mornings, next week afternoons)?"
+- Once you have ALL required information (including availability), call the book_staff_meeting function
+- Remember: staff_member and purpose may have been mentioned earlier in the conversation!
+- IMPORTANT: After calling book_staff_meeting, say "I've submitted your meeting request" NOT "I've arranged a meeting" - the school office will contact them to confirm a time
+"""
+
+    if family_ctx:
+        child_name = family_ctx.get('child_name', 'your daughter')
+        parent_name = family_ctx.get('parent_name', 'Parent')
+        year_group = family_ctx.get('year_group', '')
+
+        system_prompt += f"""
+FAMILY CONTEXT:
+Parent: {parent_name}
+Child: {child_name}
+Year group: {year_group}
+
+Personalize your responses using this information.
+"""
+
+    return system_prompt
+
 @app.route('/ask-with-tools', methods=['POST'])
 def ask_with_tools():
     """AI-powered endpoint with knowledge base integration and tool support"""
     data = request.json or {}
+    school = request_school(data)
     question = data.get('question', '')
     language = data.get('language', 'en')
     family_id = data.get('family_id')
@@ -1171,51 +1600,38 @@ def ask_with_tools():
 
     if not question:
         return jsonify({"answer": "Please ask a question.", "queries": []})
+    if not is_warmup_request():
+        record_question(school.key, language, question, request.path)
 
     q_lower = question.strip().lower()
     print(f"🤖 AI-powered /ask-with-tools: '{q_lower}' | Language: {language}")
-
-    # Topics that should ALWAYS use AI knowledge base for rich, detailed answers
-    # (not just redirect to pages)
-    AI_ONLY_TOPICS = [
-        'pastoral care', 'safeguarding', 'learning support', 'academic life',
-        'subjects', 'results', 'inspection', 'sixth form',
-        'sport', 'co-curricular', 'faith life', 'facilities',
-        'location', 'transport', 'term dates', 'uniform', 'lunch menu',
-        'ethos', 'calendar', 'policies', 'virtual tour',
-        'fees', 'bursaries', 'scholarships',  # Use AI for detailed fees info
-        'admissions', 'entry points', 'registration deadlines'  # Use AI for admissions details
-    ]
+    topic = AI_ONLY_TOPIC_KEYS.get(normalise_variant(question))
 
     # STEP 1: Try static Q&A only for action-oriented queries (fees, enquiry, booking, etc.)
     # Skip static for informational topics - they should use AI knowledge base
     use_static = True
-    if q_lower in AI_ONLY_TOPICS:
+    if topic is not None:
         use_static = False
         print(f"🎯 '{q_lower}' is an AI-only topic - skipping static Q&A")
 
-    if use_static:
-        for qa in STATIC_QAS:
-            if qa['language'] != language:
-                continue
-            variants = [qa['key']] + qa.get('variants', [])
-            if q_lower in [v.lower() for v in variants]:
-                print(f"✅ Static match: {qa['key']}")
-                answer = qa['answer']
+    qa = school.static_index.lookup(language, question) if use_static else None
+    if qa is not None:
+        print(f"✅ Static match: {qa['key']}")
+        answer = qa['answer']
 
-                # Get contextual buttons
-                suggestions = get_suggestions(qa['key'], language)
-                queries, query_map = _format_button_suggestions(suggestions)
+        # Get contextual buttons
+        suggestions = get_suggestions(qa['key'], language, qa_list=school.static_qas, matcher=school.fuzzy)
+        queries, query_map = _format_button_suggestions(suggestions)
 
-                return jsonify({
-                    "answer": answer,
-                    "url": qa.get('url'),
-                    "label": qa.get('label'),
-                    "queries": queries,
-                    "query_map": query_map,
-                    "session_id": session_id,
-                    "source": "static"
-                })
+        return jsonify({
+            "answer": answer,
+            "url": qa.get('url'),
+            "label": qa.get('label'),
+            "queries": queries,
+            "query_map": query_map,
+            "session_id": session_id,
+            "source": "static"
+        })
 
     # STEP 2: Check for open days query (special case with live database)
     q_normalized = q_lower.replace('oopen', 'open')
@@ -1248,18 +1664,8 @@ def ask_with_tools():
     if is_info_query:
         print(f"✅ Open days query detected - fetching from database...")
         try:
-            response = requests.get(
-                f"{BOOKING_APP_URL}/api/events",
-                params={
-                    "schoolId": 2,
-                    "eventType": "open_day",
-                    "status": "published"
-                },
-                timeout=10
-            )
-
-            if response.status_code == 200:
-                events = response.json()
+            events = fetch_booking_events(school.booking_school_id)
+            if events is not None:
                 if events:
                     event_list = []
                     for e in events:
@@ -1273,7 +1679,7 @@ def ask_with_tools():
                         event_list.append(f"{e['title']} - {formatted_date} at {formatted_time}")
 
                     answer = "We have the following open days coming up:\n\n" + "\n\n".join(event_list)
-                    suggestions = get_suggestions('open events', language)
+                    suggestions = get_suggestions('open events', language, qa_list=school.static_qas, matcher=school.fuzzy)
                     queries, query_map = _format_button_suggestions(suggestions)
 
                     return jsonify({
@@ -1287,13 +1693,42 @@ def ask_with_tools():
             print(f"❌ Error fetching open days: {e}")
 
     # STEP 3: Use knowledge base search (RAG) with AI
+    kb = current_kb(school)
+    # Family details and earlier turns shape the answer; those aren't shared
+    history = conversation_memory.get(session_id)
+    personalised = bool(family_id or (history and history.interactions))
+    answer_ns = (school.key, "tools", language)
+    q_vec, cached = None, None
+    if not personalised:
+        if topic is not None:
+            cached = school.precomputed.get(kb.version, language, topic)
+        if cached is None:
+            q_vec = query_vector(question)
+            cached, g.answer_flight = lookup_answer(answer_ns, kb.version, question, q_vec)
+    if cached is not None:
+        print("⚡ Serving cached answer")
+        if session_id not in conversation_memory:
+            conversation_memory[session_id] = ConversationTracker(session_id, family_id)
+        conversation_memory[session_id].add_interaction(question, cached["answer"], "ai_rag")
+        suggestions = get_suggestions(question, language, qa_list=school.static_qas, matcher=school.fuzzy)
+        queries, query_map = _format_button_suggestions(suggestions)
+        return jsonify({
+            "answer": cached["answer"],
+            "url": cached["url"],
+            "label": cached["label"],
+            "queries": queries,
+            "query_map": query_map,
+            "session_id": session_id,
+            "source": "ai_rag"
+        })
+
     print(f"🔍 Searching knowledge base for: {question}")
-    sims, idxs = vector_search(question)
+    scores, idxs = filtered_search(question, filters=TOPIC_FILTERS.get(topic), kb=kb, diverse=True, q_vec=q_vec)
 
     if len(idxs) == 0:
         print("❌ No knowledge base matches found")
         answer = "I'm sorry, I don't have that specific information to hand. Would you like me to connect you with our admissions team who can help?"
-        suggestions = get_suggestions(question, language)
+        suggestions = get_suggestions(question, language, qa_list=school.static_qas, matcher=school.fuzzy)
         queries, query_map = _format_button_suggestions(suggestions)
 
         return jsonify({
@@ -1305,68 +1740,14 @@ def ask_with_tools():
         })
 
     # Got knowledge base matches - build context
-    print(f"🔵 Found {len(idxs)} knowledge base matches (best: {sims[idxs[0]]:.2f})")
-    contexts = [METADATA[i].get("text", "") for i in idxs[:10]]
+    print(f"🔵 Found {len(idxs)} knowledge base matches (best: {scores[0]:.2f})")
+    contexts = build_context(kb.chunks, scores, idxs, question, min_score=CONTEXT_MIN_SCORE)
 
     # Get family context
     family_ctx = fetch_family_context(family_id) if family_id else None
 
     # Build enhanced system prompt with STRICT knowledge base restriction
-    system_prompt = f"""You are Emily, the AI assistant for More House School.
-Be warm, helpful, and professional. Use British spelling.
-Language: {language}
-
-CRITICAL: You must ONLY use information from the provided knowledge base passages below.
-DO NOT use any external knowledge or make assumptions beyond what is explicitly stated in these passages.
-If the answer is not in the passages, say you don't have that specific information.
-
-FORMATTING RULES:
-- DO NOT use markdown formatting (no **, __, *, etc.)
-- Use plain text only
-- For lists, use simple dashes or numbers
-- Separate sections with blank lines, not with bold headings
-- Keep formatting clean and simple for text display
-
-KNOWLEDGE BASE:
----
-{chr(10).join(['---' + chr(10) + ctx for ctx in contexts])}
----
-
-CONVERSATION MEMORY:
-You have access to the conversation history. Use it to remember:
-- What the parent asked for in previous messages
-- Information they've already provided (name, email, phone, etc.)
-- The context of the current conversation
-DO NOT ask for information the parent has already provided in earlier messages.
-
-AVAILABLE ACTIONS:
-You can help parents in the following ways:
-1. Book tours and visits - use the send_enquiry_email function
-2. Book meetings with staff members - use the book_staff_meeting function when they want to meet with specific staff (registrar, head, bursar, etc.)
-3. Answer questions about the school using only the knowledge base provided
-
-When a parent wants to book a meeting with a staff member:
-- First, note which staff member they want to meet and why (from their request)
-- Ask for any missing information: name, email, phone, AND their availability/preferred times
-- Example: "Could you please provide your full name, email, phone number, and some times that work for you (e.g., weekday mornings, next week afternoons)?"
-- Once you have ALL required information (including availability), call the book_staff_meeting function
-- Remember: staff_member and purpose may have been mentioned earlier in the conversation!
-- IMPORTANT: After calling book_staff_meeting, say "I've submitted your meeting request" NOT "I've arranged a meeting" - the school office will contact them to confirm a time
-"""
-
-    if family_ctx:
-        child_name = family_ctx.get('child_name', 'your daughter')
-        parent_name = family_ctx.get('parent_name', 'Parent')
-        year_group = family_ctx.get('year_group', '')
-
-        system_prompt += f"""
-FAMILY CONTEXT:
-Parent: {parent_name}
-Child: {child_name}
-Year group: {year_group}
-
-Personalize your responses using this information.
-"""
+    system_prompt = tools_system_prompt(school, language, contexts, family_ctx)
 
     # Define email sending tools
     tools = [
@@ -1374,7 +1755,7 @@ Personalize your responses using this information.
             "type": "function",
             "function": {
                 "name": "send_enquiry_email",
-                "description": "Send a tour booking or general enquiry email to More House admissions. Use when parent wants to book a tour, visit, or contact the school with general questions.",
+                "description": school.prompt("enquiry_tool"),
                 "parameters": {
                     "type": "object",
                     "properties": {
@@ -1437,6 +1818,8 @@ Personalize your responses using this information.
             }
         }
     ]
+    # Both actions email the school's admissions office; without one, answer only
+    tool_args = {"tools": tools, "tool_choice": "auto"} if school.admissions_email else {}
 
     # Get or create conversation tracker for context
     if session_id:
@@ -1474,8 +1857,7 @@ Personalize your responses using this information.
         response = client.chat.completions.create(
             model="gpt-4o-mini",
             messages=messages,
-            tools=tools,
-            tool_choice="auto",
+            **tool_args,
             temperature=0.3,  # Lower temperature for more factual responses
             max_tokens=500  # Increased for multi-turn conversations
         )
@@ -1492,6 +1874,11 @@ Personalize your responses using this information.
             else:
                 f.write(f"   Content: {message.content[:200]}...\n")
 
+        if message.tool_calls and is_warmup_request():
+            # Replayed traffic must never send email or book meetings
+            print(f"⏭️ Warm-up skipped tool call for '{q_lower}'")
+            return jsonify({"answer": None, "source": "warmup"})
+
         # Handle tool calls (email sending)
         if message.tool_calls:
             tool_call = message.tool_calls[0]
@@ -1507,7 +1894,7 @@ Personalize your responses using this information.
                 body_html = f"""
                 <html>
                   <body style="font-family: Arial, sans-serif;">
-                    <h2 style="color: #091825;">New Tour Enquiry - More House School</h2>
+                    <h2 style="color: #091825;">New Tour Enquiry - {school.name}</h2>
 
                     <table style="border-collapse: collapse; width: 100%; max-width: 600px;">
                       <tr>
@@ -1530,7 +1917,7 @@ Personalize your responses using this information.
                     </p>
 
                     <p style="color: #666; font-size: 12px; margin-top: 30px;">
-                      <em>This enquiry was sent via Emily, the More House AI assistant.</em>
+                      <em>This enquiry was sent via Emily, the {school.name} AI assistant.</em>
                     </p>
                   </body>
                 </html>
@@ -1544,7 +1931,7 @@ Personalize your responses using this information.
                 body_html = f"""
                 <html>
                   <body style="font-family: Arial, sans-serif;">
-                    <h2 style="color: #091825;">Meeting Request - More House School</h2>
+                    <h2 style="color: #091825;">Meeting Request - {school.name}</h2>
 
                     <table style="border-collapse: collapse; width: 100%; max-width: 600px;">
                       <tr>
@@ -1578,7 +1965,7 @@ Personalize your responses using this information.
                     </p>
 
                     <p style="color: #666; font-size: 12px; margin-top: 30px;">
-                      <em>This meeting request was sent via Emily, the More House AI assistant.</em>
+                      <em>This meeting request was sent via Emily, the {school.name} AI assistant.</em>
                     </p>
                   </body>
                 </html>
@@ -1591,12 +1978,12 @@ Personalize your responses using this information.
             # Send email via Gmail
             with open('/tmp/emily_debug.log', 'a') as f:
                 f.write(f"\n📧 Sending email:\n")
-                f.write(f"   To: {ADMISSIONS_EMAIL}\n")
+                f.write(f"   To: {school.admissions_email}\n")
                 f.write(f"   CC: {function_args['parent_email']}\n")
                 f.write(f"   Subject: {subject}\n")
 
             success, result_msg = send_email_via_gmail(
-                to_email=ADMISSIONS_EMAIL,
+                to_email=school.admissions_email,
                 cc_email=function_args['parent_email'],
                 subject=subject,
                 body_html=body_html
@@ -1628,14 +2015,18 @@ Personalize your responses using this information.
             answer = message.content
 
         # Get contextual button suggestions
-        suggestions = get_suggestions(question, language)
+        suggestions = get_suggestions(question, language, qa_list=school.static_qas, matcher=school.fuzzy)
         queries, query_map = _format_button_suggestions(suggestions)
 
         # Get URL from best matching metadata
-        meta = METADATA[idxs[0]]
+        meta = kb.chunks[idxs[0]]
         url = meta.get('url')
         label = meta.get('label') or "View document"
 
+        if not personalised and not message.tool_calls:
+            ANSWER_CACHE.store(answer_ns, kb.version, question, q_vec,
+                               {"answer": answer, "url": url, "label": label})
+
         # Track this interaction in conversation memory
         if tracker:
             interaction_type = "ai_tool" if message.tool_calls else "ai_rag"
@@ -1660,6 +2051,69 @@ Personalize your responses using this information.
             "error": str(e)
         }), 500
 
+# ── Precomputed topic answers ───────────────────────────────────────────
+# The AI-only topics are what the suggestion buttons send, so their answers
+# are generated once per KB version and language and served from
+# kb_precomputed_answers.json. With PRECOMPUTE_ANSWERS=1 each school
+# rebuilds them in the background when loaded with a stale file and after
+# every KB reload; precompute_answers.py does the same from the shell.
+PRECOMPUTE_ANSWERS = os.getenv("PRECOMPUTE_ANSWERS", "0") == "1"
+
+def generate_topic_answer(school: School, kb: KnowledgeBase, topic: str, language: str,
+                          hits=None) -> Optional[Dict[str, Any]]:
+    """The answer /ask-with-tools would give a fresh session asking topic.
+
+    hits are the (scores, idxs) of the topic's filtered search if already
+    run; without them, or if they're empty, filtered_search runs here.
+    """
+    scores, idxs = hits if hits is not None and len(hits[1]) else \
+        filtered_search(topic, filters=TOPIC_FILTERS.get(topic), kb=kb, diverse=True)
+    if len(idxs) == 0:
+        return None
+    contexts = build_context(kb.chunks, scores, idxs, topic, min_score=CONTEXT_MIN_SCORE)
+    chat = client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": tools_system_prompt(school, language, contexts)},
+            {"role": "user", "content": topic},
+        ],
+        temperature=0.3,
+        max_tokens=500
+    )
+    meta = kb.chunks[idxs[0]]
+    return {"answer": chat.choices[0].message.content, "url": meta.get('url'),
+            "label": meta.get('label') or "View document"}
+
+def refresh_precomputed_answers(school: School, kb: Optional[KnowledgeBase] = None) -> int:
+    """Rebuild the school's precomputed answers unless they match the KB version"""
+    kb = kb or current_kb(school)
+    if school.precomputed.is_current(kb.version):
+        return 0
+    hits: Dict[str, tuple] = {}
+
+    def generate(topic: str, language: str) -> Optional[Dict[str, Any]]:
+        # Every language draws on the same passages, so all the topics are
+        # searched together on the first call, once the build lock is held
+        if not hits:
+            filters = [TOPIC_FILTERS.get(t) for t in AI_ONLY_TOPICS]
+            hits.update(zip(AI_ONLY_TOPICS, vector_search_many(AI_ONLY_TOPICS, filters=filters, kb=kb,
+                                                                diverse=True)))
+        return generate_topic_answer(school, kb, topic, language, hits=hits.get(topic))
+
+    return school.precomputed.build(kb.version, AI_ONLY_TOPICS, generate)
+
+def _watch_precomputed_answers(school: School) -> None:
+    def refresh(kb: Optional[KnowledgeBase] = None):
+        threading.Thread(target=refresh_precomputed_answers, args=(school, kb),
+                         name=f"precompute-{school.key}", daemon=True).start()
+    school.kb_holder.listeners.append(refresh)
+    refresh()
+
+if PRECOMPUTE_ANSWERS:
+    SCHOOLS.on_load = _watch_precomputed_answers
+    for _key in SCHOOLS.loaded():
+        _watch_precomputed_answers(SCHOOLS.get(_key))
+
 # ── Enhanced Realtime Session for Voice ─────────────────────────────────
 @app.route("/realtime/session", methods=["POST"])
 def create_realtime_session():
@@ -1670,6 +2124,7 @@ def create_realtime_session():
         return jsonify({"ok": False, "error": "OPENAI_API_KEY not set"}), 500
 
     body = request.get_json(silent=True) or {}
+    school = request_school(body)
     
     # Generate session ID for conversation tracking
     session_id = str(uuid.uuid4())
@@ -1725,26 +2180,12 @@ def create_realtime_session():
         "- Pastoral care, wellbeing, SEND support, enrichment\n"
         "- School history, ethos, values, uniform, location\n"
         "\n"
-        "NEVER guess or make up factual information about More House School.\n"
+        f"NEVER guess or make up factual information about {school.name}.\n"
         "ALWAYS call kb_search first for any factual question about the school.\n"
         "Example: If asked 'How much are the fees?', IMMEDIATELY call kb_search with query 'school fees tuition costs'.\n"
         "After getting the kb_search result, present it naturally in your warm, conversational tone.\n"
         "=================================\n\n"
-        "You are Emily, a warm and knowledgeable admissions advisor for More House School, "
-        "an independent all-girls school in Knightsbridge, London. "
-        "Speak with a friendly British accent, using natural conversational tone. "
-        "Keep responses concise but complete - aim for 2-3 sentences per turn. "
-        "\n\n"
-        "=== KEY SCHOOL FACTS (memorise these) ===\n"
-        "School Fees 2025-2026:\n"
-        "  • Years 5 and 6: £7,800 per term (inc VAT)\n"
-        "  • Years 7-13: £10,950 per term (inc VAT)\n"
-        "Location: 22-24 Pont Street, Chelsea, London SW1X 0AA\n"
-        "Type: Independent all-girls school\n"
-        "Age range: Years 5-13 (ages 9-18)\n"
-        "Contact: 020 7235 2855 | registrar@morehousemail.org.uk\n"
-        "For ALL other detailed questions, use the kb_search tool.\n"
-        "=================================\n\n"
+        + school.prompt("realtime_profile") +
         "ALWAYS complete your thoughts before pausing. "
         "IMPORTANT: Always finish your sentences completely. "
         "Never stop mid-sentence or mid-thought. "
@@ -1786,7 +2227,7 @@ def create_realtime_session():
         "- Speed up slightly when listing things "
         "- Slow down for important information "
         "- Use emphasis naturally: 'We have THE most amazing science labs' "
-        "- Trail off occasionally: 'The thing about More House is...' "
+        f"- Trail off occasionally: 'The thing about {school.name} is...' "
         "Never sound robotic or scripted. "
         "Never be perfectly eloquent - humans stumble occasionally. "
         "Never cut off mid-sentence abruptly. "
@@ -1823,11 +2264,13 @@ def create_realtime_session():
                     {
                         "type": "function",
                         "name": "kb_search",
-                        "description": "REQUIRED: Search More House School's knowledge base for factual information. MUST be called for any question about: fees, costs, tuition, admissions, curriculum, facilities, staff, timings, support services, or any other factual school information. Returns accurate, verified information from school documentation.",
+                        "description": school.prompt("kb_search_tool"),
                         "parameters": {
                             "type": "object",
                             "properties": {
-                                "query": {"type": "string", "description": "Search query for the knowledge base (e.g., 'school fees tuition costs', 'admissions process requirements', 'curriculum subjects')"}
+                                "query": {"type": "string", "description": "Search query for the knowledge base (e.g., 'school fees tuition costs', 'admissions process requirements', 'curriculum subjects')"},
+                                "source_prefix": {"type": "string", "description": "Optional: restrict to a site section when the topic is clear, e.g. '/admissions/' for fees and admissions, '/information/school-policies/' for policies"},
+                                "doc_type": {"type": "string", "enum": ["pdf", "html"], "description": "Optional: 'pdf' for policy documents, 'html' for web pages"}
                             },
                             "required": ["query"]
                         }
@@ -1891,7 +2334,9 @@ def create_realtime_session():
             },
             timeout=15,
         )
-        return jsonify(r.json())
+        # The client sends this back with its tool calls, which would
+        # otherwise search the default school
+        return jsonify({**r.json(), "school": school.key})
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 500
 
@@ -2111,7 +2556,7 @@ def emily_verify_family():
 
     try:
         # Call booking app API
-        response = requests.post(
+        response = BOOKING_HTTP.post(
             f"{BOOKING_APP_URL}/api/verify-parent",
             json={"email": email, "phone": phone},
             timeout=10
@@ -2237,20 +2682,11 @@ def emily_submit_enquiry():
 @app.route("/api/emily/get-events", methods=["GET"])
 def emily_get_events():
     """Get upcoming open day events from booking app"""
+    school = request_school()
     try:
         # Call booking app API
-        response = requests.get(
-            f"{BOOKING_APP_URL}/api/events",
-            params={
-                "schoolId": 2,  # More House
-                "eventType": "open_day",
-                "status": "published"
-            },
-            timeout=10
-        )
-
-        if response.ok:
-            result = response.json()
+        result = fetch_booking_events(school.booking_school_id)
+        if result is not None:
             return jsonify(result)
         else:
             return jsonify({"events": []}), 200
@@ -2266,7 +2702,7 @@ def emily_create_booking():
 
     try:
         # Call booking app API
-        response = requests.post(
+        response = BOOKING_HTTP.post(
             f"{BOOKING_APP_URL}/api/bookings",
             json=data,
             timeout=10
@@ -2283,5 +2719,107 @@ def emily_create_booking():
         print(f"Error creating booking: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
 
+# ── Cache warm-up ───────────────────────────────────────────────────────
+# With CACHE_WARMUP=1 workers replay the most asked recent questions
+# (TRAFFIC_LOG, else chat_interactions) through their own endpoints before
+# reporting ready, filling the embedding, answer and translation caches.
+# With a shared CACHE_BACKEND one worker per deploy replays (elected by a
+# lock file, keyed on the deployed commit or KB build and the gunicorn
+# master) and the rest wait for it, then read its answers from the shared
+# cache; with the in-process memory backend every worker has to replay for
+# itself.
+CACHE_WARMUP = os.getenv("CACHE_WARMUP", "0") == "1"
+WARMUP_ENVIRON_KEY = "emily.warmup"  # set on replayed requests; clients can't set WSGI environ keys
+
+def is_warmup_request() -> bool:
+    return bool(request.environ.get(WARMUP_ENVIRON_KEY))
+
+def replay_question(q: WarmupQuestion) -> None:
+    resp = app.test_client().post(
+        q.endpoint,
+        json={"question": q.question, "language": q.language, "school": q.school},
+        environ_base={WARMUP_ENVIRON_KEY: True},
+    )
+    if resp.status_code >= 400:
+        raise RuntimeError(f"{q.endpoint} returned {resp.status_code}")
+
+def warm_up_caches() -> Dict[str, int]:
+    election = None
+    if shared_cache().name != "memory":
+        # The master is often PID 1 in a container, so on its own it would
+        # match a lock file left by the previous deploy's workers
+        deploy = os.getenv("RENDER_GIT_COMMIT") or current_kb().version
+        election = WarmupElection(deploy=f"{deploy}:{os.getppid()}")
+        if not election.claim():
+            print("🔥 Cache warm-up: another worker is replaying, waiting for it")
+            if not election.wait():
+                print("⚠️ Cache warm-up: gave up waiting for the replaying worker")
+            return {}
+    try:
+        questions = load_warmup_questions(db_pool)
+        if not questions:
+            print("🔥 Cache warm-up: no recorded questions yet")
+            return {}
+        return warm_caches(questions, replay_question)
+    finally:
+        if election is not None:
+            election.finish()
+
+# ── Startup warm-up and readiness ───────────────────────────────────────
+# STARTUP_WARMUP=1 pays the first request's one-off costs at boot instead:
+# TLS handshakes to OpenAI, DeepL and the booking app (all pooled), the
+# Postgres pool, and the first search (BLAS threads, page faults on the
+# memory-mapped vectors, IVF and BM25 arrays). It runs in the background
+# together with the cache warm-up; /ready answers 503 until both finish so
+# the load balancer's health check (render.yaml) holds traffic back.
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "0") == "1"
+WARMUP_STATUS: Dict[str, Any] = {"ready": False, "steps": {}}
+
+def _check_db_pool():
+    with db_pool.connection(timeout=10) as conn:
+        conn.execute("SELECT 1")
+
+def warm_up_connections() -> None:
+    school = SCHOOLS.get()
+    steps = [
+        ("db_pool", _check_db_pool if db_pool else None),
+        ("openai", lambda: client.with_options(timeout=10).models.retrieve("gpt-4o-mini")),
+        ("deepl", warm_up_translation),
+        ("booking_app", lambda: fetch_booking_events(school.booking_school_id)),
+        ("vector_search", lambda: vector_search("open day", kb=current_kb(school), diverse=True)),
+    ]
+    done: Dict[str, Any] = {}
+    for name, step in steps:
+        if step is None:
+            continue
+        started = time.monotonic()
+        try:
+            step()
+            done[name] = round(time.monotonic() - started, 3)
+        except Exception as e:
+            print(f"⚠️ Warm-up step {name} failed: {e}")
+            done[name] = f"failed: {e}"
+        WARMUP_STATUS["steps"] = dict(done)  # /ready may be reading the old one
+    print(f"🔥 Startup warm-up: {done}")
+
+def run_startup_warmup() -> None:
+    try:
+        if STARTUP_WARMUP:
+            warm_up_connections()
+        if CACHE_WARMUP:
+            WARMUP_STATUS["cache"] = warm_up_caches()
+    finally:
+        WARMUP_STATUS["ready"] = True
+
+@app.route("/ready", methods=["GET"])
+def ready():
+    """200 once this worker has warmed up, 503 while it is still warming"""
+    return jsonify({"pid": os.getpid(), **WARMUP_STATUS}), 200 if WARMUP_STATUS["ready"] else 503
+
+if STARTUP_WARMUP or CACHE_WARMUP:
+    threading.Thread(target=run_startup_warmup, name="startup-warmup", daemon=True).start()
+else:
+    WARMUP_STATUS["ready"] = True
+
 if __name__ == '__main__':
     app.run(debug=True, ssl_context='adhoc', port=5001)
\ No newline at end of file
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Check FuzzyMatcher against the full difflib loop it replaced.
+
+Queries are static Q&A variants with typos, shuffled variant words and
+variants with extra words appended. For each query both report the best
+entry and ratio; the script counts disagreements, any that change the
+0.3 (suggestion buttons) or 0.8 (fuzzy answer) decision, and the mean
+latency of each. Exits non-zero if a threshold decision differs.
+"""
+import sys
+import time
+import random
+from difflib import SequenceMatcher
+
+from static_qa_config import STATIC_QA_LIST
+from static_qa_index import FuzzyMatcher
+
+N_QUERIES = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+LANGUAGE = sys.argv[2] if len(sys.argv) > 2 else "en"
+THRESHOLDS = (0.3, 0.8)
+
+
+def full_scan(question, language):
+    """The loop find_best_answer and get_suggestions used to run"""
+    best_score, best_match = 0, None
+    for qa in STATIC_QA_LIST:
+        if qa['language'] != language:
+            continue
+        for var in [qa['key']] + qa.get('variants', []):
+            score = SequenceMatcher(None, question.lower(), var.lower()).ratio()
+            if score > best_score:
+                best_score, best_match = score, qa
+    return best_match, best_score
+
+
+# ─── Build queries ────────────────────────────────────
+rng = random.Random(0)
+texts = [v.lower() for qa in STATIC_QA_LIST if qa['language'] == LANGUAGE
+         for v in [qa['key']] + qa.get('variants', [])]
+words = " ".join(texts).split()
+queries = []
+for _ in range(N_QUERIES):
+    r = rng.random()
+    if r < 0.4:
+        chars = list(rng.choice(texts))
+        for _ in range(rng.randint(1, 4)):
+            chars[rng.randrange(len(chars))] = rng.choice("abcdefghijklmnopqrstuvwxyz ")
+        queries.append("".join(chars))
+    elif r < 0.8:
+        queries.append(" ".join(rng.sample(words, rng.randint(2, 8))))
+    else:
+        queries.append(rng.choice(texts) + " " + " ".join(rng.sample(words, 3)))
+
+# ─── Compare ──────────────────────────────────────────
+matcher = FuzzyMatcher(STATIC_QA_LIST)
+start = time.perf_counter()
+indexed = [matcher.best(LANGUAGE, q) for q in queries]
+indexed_ms = (time.perf_counter() - start) * 1000 / len(queries)
+start = time.perf_counter()
+expected = [full_scan(q, LANGUAGE) for q in queries]
+full_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+differ = [(q, got, want) for q, got, want in zip(queries, indexed, expected)
+          if got[0] is not want[0] or abs(got[1] - want[1]) > 1e-12]
+flipped = [(q, got, want) for q, got, want in differ
+           if any((got[1] > t) != (want[1] > t) or (want[1] > t and got[0] is not want[0]) for t in THRESHOLDS)]
+
+print(f"🔍 {len(queries)} {LANGUAGE} queries: {len(differ)} differ from the full scan, "
+      f"{len(flipped)} change a {'/'.join(map(str, THRESHOLDS))} decision")
+print(f"⏱️  FuzzyMatcher {indexed_ms:.2f} ms/query, full scan {full_ms:.2f} ms/query")
+for q, got, want in flipped[:10]:
+    print(f"🔸 '{q}': {got[0] and got[0]['key']} {got[1]:.3f} vs {want[0] and want[0]['key']} {want[1]:.3f}")
+sys.exit(1 if flipped else 0)
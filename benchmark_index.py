@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark KnowledgeIndex search modes against exact float32 search.
+
+Reports recall@k (overlap with the exact top-k), mean query latency and
+the size of the matrix each mode scans, then sweeps IVF nprobe. Queries
+are KB vectors with added noise, so no embeddings API calls are made.
+Falls back to a synthetic clustered KB when kb_chunks/ has not been built.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+from knowledge_index import (
+    KnowledgeIndex, QUANTISATION_MODES, has_binary_kb, load_binary_kb, load_pickle_kb,
+)
+
+KB_FOLDER = "kb_chunks"
+K = 10
+N_QUERIES = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+NOISE = 0.05
+
+# ─── Load vectors ─────────────────────────────────────
+if has_binary_kb(KB_FOLDER):
+    base, _ = load_binary_kb(KB_FOLDER)
+    print(f"📚 Loaded binary KB: {len(base)} chunks")
+elif os.path.exists(f"{KB_FOLDER}/kb_chunks.pkl"):
+    base, _ = load_pickle_kb(f"{KB_FOLDER}/kb_chunks.pkl")
+    print(f"📚 Loaded pickle KB: {len(base)} chunks")
+else:
+    # Topic clusters plus noise, loosely like real page embeddings
+    rng = np.random.default_rng(0)
+    topics = rng.standard_normal((200, 1536), dtype=np.float32)
+    synthetic = topics[rng.integers(0, 200, size=20000)] + 0.8 * rng.standard_normal((20000, 1536), dtype=np.float32)
+    base = KnowledgeIndex(synthetic)
+    print(f"⚠️ No KB found, using synthetic {len(base)} × {base.dim} vectors")
+
+vectors = np.asarray(base.vectors)
+
+# ─── Build queries ────────────────────────────────────
+rng = np.random.default_rng(42)
+rows = rng.choice(len(vectors), size=min(N_QUERIES, len(vectors)), replace=False)
+queries = vectors[rows] + NOISE * rng.standard_normal((len(rows), vectors.shape[1]), dtype=np.float32)
+
+exact = [set(base.search(q, K)[1].tolist()) for q in queries]
+
+# ─── Compare modes ────────────────────────────────────
+print(f"\n🔍 recall@{K} over {len(queries)} queries")
+for mode in QUANTISATION_MODES:
+    index = KnowledgeIndex(vectors, normalised=True, quantisation=mode)
+    scanned = index.coarse if index.coarse is not None else index.vectors
+
+    start = time.perf_counter()
+    results = [index.search(q, K)[1] for q in queries]
+    elapsed_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    recall = np.mean([len(exact[i] & set(r.tolist())) / K for i, r in enumerate(results)])
+    print(f"🔹 {mode:8s}  recall={recall:.4f}  latency={elapsed_ms:.2f} ms  "
+          f"scanned matrix={scanned.nbytes / 1e6:.1f} MB")
+
+# ─── IVF nprobe sweep ─────────────────────────────────
+index = KnowledgeIndex(vectors, normalised=True)
+start = time.perf_counter()
+ivf = index.build_ivf()
+print(f"\n🧭 IVF: {ivf.nlist} lists built in {time.perf_counter() - start:.1f} s")
+for nprobe in (1, 4, 8, 16, 32):
+    start = time.perf_counter()
+    results = [index.search(q, K, nprobe=nprobe)[1] for q in queries]
+    elapsed_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    recall = np.mean([len(exact[i] & set(r.tolist())) / K for i, r in enumerate(results)])
+    print(f"🔹 nprobe={nprobe:<3d} recall={recall:.4f}  latency={elapsed_ms:.2f} ms")
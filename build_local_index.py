@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+"""
+Build the local n-gram embedding index that app.py falls back to when the
+OpenAI embeddings API fails or times out (kb_local_*.npy + kb_local_meta.json).
+
+Needs the binary KB (convert_kb_to_binary.py) and no network. Re-run it
+whenever the KB is rebuilt; a stale index is ignored at load time.
+Set LOCAL_EMBEDDING_DIMENSIONS to trade recall for memory (default 256).
+"""
+import sys
+import time
+
+from embedding_backends import build_local_index, KB_LOCAL_VECTORS_FILE
+
+KB_FOLDER = sys.argv[1] if len(sys.argv) > 1 else "kb_chunks"
+
+start = time.perf_counter()
+local = build_local_index(KB_FOLDER)
+print(f"✅ Wrote {KB_FOLDER}/{KB_LOCAL_VECTORS_FILE}: {len(local.index)} × {local.index.dim} "
+      f"in {time.perf_counter() - start:.1f} s")
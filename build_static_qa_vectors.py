@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Embed every key and variant of each school's static Q&A list
+(kb_static_qa_vectors.npy + kb_static_qa_meta.json in its KB folder), so
+find_best_answer can match paraphrases of a curated question before RAG.
+
+Uses the primary embedding backend (EMBEDDING_BACKEND), which must be the
+one the app embeds queries with. Re-run after editing the static Q&A; a
+stale file is ignored at load time.
+
+Usage: python build_static_qa_vectors.py [school ...]
+"""
+import os
+import sys
+import importlib
+
+from dotenv import load_dotenv
+
+from embedding_backends import get_backend
+from school_registry import DEFAULT_SCHOOL, load_school_configs
+from static_qa_vectors import STATIC_QA_VECTORS_FILE, build_static_qa_vectors
+
+load_dotenv()
+backend = get_backend()
+configs = load_school_configs(os.getenv("SCHOOLS_CONFIG"))
+
+for key in sys.argv[1:] or [os.getenv("DEFAULT_SCHOOL", DEFAULT_SCHOOL)]:
+    config = configs[key]
+    qa_list = importlib.import_module(config.static_qa_module).STATIC_QA_LIST
+    vectors = build_static_qa_vectors(config.kb_folder, qa_list, backend)
+    rows = sum(len(entries) for _, entries in vectors.languages.values())
+    print(f"✅ {config.name}: {rows} variants in {len(vectors.languages)} languages "
+          f"written to {config.kb_folder}/{STATIC_QA_VECTORS_FILE}")
@@ -0,0 +1,449 @@
+# cache_backend.py
+"""Namespaced key/value cache with in-process, SQLite and Postgres backends"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")           # memory | sqlite | postgres
+CACHE_PATH = os.getenv("CACHE_PATH", "emily_cache.sqlite3")    # sqlite file shared by workers
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "50000"))
+CACHE_L1_ENTRIES = int(os.getenv("CACHE_L1_ENTRIES", "5000"))  # per-worker hot copy of a shared cache
+CACHE_GENERATION_CHECK = float(os.getenv("CACHE_GENERATION_CHECK", "2"))  # seconds a worker trusts its hot copy
+TRIM_EVERY = 500  # shared backends trim to max_entries once per this many writes
+GENERATION_NAMESPACE = "_generation"  # flush tokens TieredCache workers compare against
+
+
+class CacheBackend:
+    """bytes values under (namespace, key), each with an optional TTL in seconds.
+
+    Subclasses implement _get_entry/_set/_add/_delete/_flush/_sizes; hit, miss and
+    write counters are kept per namespace in this process.
+    """
+
+    name = "base"
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._counters: Dict[str, Dict[str, int]] = defaultdict(lambda: {"hits": 0, "misses": 0, "sets": 0})
+        self._counter_lock = threading.Lock()
+
+    def _count(self, namespace: str, what: str) -> None:
+        with self._counter_lock:
+            self._counters[namespace][what] += 1
+
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        entry = self.get_entry(namespace, key)
+        return None if entry is None else entry[1]
+
+    def get_entry(self, namespace: str, key: str) -> Optional[Tuple[Optional[float], bytes]]:
+        """(expires, value) for a live entry, else None; expires is None without a TTL"""
+        entry = self._get_entry(namespace, key)
+        self._count(namespace, "misses" if entry is None else "hits")
+        return entry
+
+    def set(self, namespace: str, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        expires = time.time() + ttl if ttl else None
+        try:
+            self._set(namespace, key, bytes(value), expires)
+        except Exception as e:
+            # A cache that can't be written is a slow path, not an error
+            print(f"⚠️ Cache write failed ({self.name}/{namespace}): {e}")
+            return
+        self._count(namespace, "sets")
+
+    def add(self, namespace: str, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        """Store value only if key has no live entry; True if it was stored.
+
+        Atomic across every process sharing the backend, so it can serve as
+        a lease; a failed write counts as not stored.
+        """
+        expires = time.time() + ttl if ttl else None
+        try:
+            return self._add(namespace, key, bytes(value), expires)
+        except Exception as e:
+            print(f"⚠️ Cache write failed ({self.name}/{namespace}): {e}")
+            return False
+
+    def delete(self, namespace: str, key: str) -> None:
+        self._delete(namespace, key)
+
+    def flush(self, namespace: Optional[str] = None) -> int:
+        """Remove every entry in namespace (all namespaces if None); returns the count removed"""
+        return self._flush(namespace)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        sizes = self._sizes()
+        with self._counter_lock:
+            names = set(sizes) | set(self._counters)
+            out = {}
+            for ns in sorted(names):
+                counters = dict(self._counters.get(ns, {"hits": 0, "misses": 0, "sets": 0}))
+                lookups = counters["hits"] + counters["misses"]
+                counters["hit_rate"] = round(counters["hits"] / lookups, 4) if lookups else None
+                counters["entries"] = sizes.get(ns, 0)
+                out[ns] = counters
+            return out
+
+    # ── Typed helpers ───────────────────────────────────────────────────
+    def get_json(self, namespace: str, key: str) -> Any:
+        raw = self.get(namespace, key)
+        return None if raw is None else json.loads(raw)
+
+    def set_json(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self.set(namespace, key, json.dumps(value, ensure_ascii=False).encode("utf-8"), ttl)
+
+    def get_array(self, namespace: str, key: str) -> Optional[np.ndarray]:
+        raw = self.get(namespace, key)
+        return None if raw is None else np.frombuffer(raw, dtype=np.float32)
+
+    def set_array(self, namespace: str, key: str, value: np.ndarray, ttl: Optional[float] = None) -> None:
+        self.set(namespace, key, np.asarray(value, dtype=np.float32).tobytes(), ttl)
+
+    # ── Backend hooks ───────────────────────────────────────────────────
+    def _get(self, namespace: str, key: str) -> Optional[bytes]:
+        entry = self._get_entry(namespace, key)
+        return None if entry is None else entry[1]
+
+    def _get_entry(self, namespace: str, key: str) -> Optional[Tuple[Optional[float], bytes]]:
+        raise NotImplementedError
+
+    def _set(self, namespace: str, key: str, value: bytes, expires: Optional[float]) -> None:
+        raise NotImplementedError
+
+    def _add(self, namespace: str, key: str, value: bytes, expires: Optional[float]) -> bool:
+        raise NotImplementedError
+
+    def _delete(self, namespace: str, key: str) -> None:
+        raise NotImplementedError
+
+    def _flush(self, namespace: Optional[str]) -> int:
+        raise NotImplementedError
+
+    def _sizes(self) -> Dict[str, int]:
+        raise NotImplementedError
+
+
+class MemoryCache(CacheBackend):
+    """In-process LRU; private to one worker"""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        super().__init__(max_entries)
+        self._data: "OrderedDict[Tuple[str, str], Tuple[Optional[float], bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_entry(self, namespace, key):
+        with self._lock:
+            entry = self._data.get((namespace, key))
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires is not None and expires < time.time():
+                del self._data[(namespace, key)]
+                return None
+            self._data.move_to_end((namespace, key))
+            return entry
+
+    def _set(self, namespace, key, value, expires):
+        with self._lock:
+            self._store(namespace, key, value, expires)
+
+    def _store(self, namespace, key, value, expires):
+        self._data[(namespace, key)] = (expires, value)
+        self._data.move_to_end((namespace, key))
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def _add(self, namespace, key, value, expires):
+        with self._lock:
+            entry = self._data.get((namespace, key))
+            if entry is not None and (entry[0] is None or entry[0] >= time.time()):
+                return False
+            self._store(namespace, key, value, expires)
+            return True
+
+    def _delete(self, namespace, key):
+        with self._lock:
+            self._data.pop((namespace, key), None)
+
+    def _flush(self, namespace):
+        with self._lock:
+            doomed = [k for k in self._data if namespace is None or k[0] == namespace]
+            for k in doomed:
+                del self._data[k]
+            return len(doomed)
+
+    def _sizes(self):
+        with self._lock:
+            sizes: Dict[str, int] = defaultdict(int)
+            for ns, _ in self._data:
+                sizes[ns] += 1
+            return dict(sizes)
+
+
+class SQLiteCache(CacheBackend):
+    """One SQLite file in WAL mode, shared by every worker on the host.
+
+    Entries are trimmed least-recently-used first to max_entries; reads
+    don't refresh recency (that would turn every hit into a write), so the
+    order is by last write.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = CACHE_MAX_ENTRIES):
+        super().__init__(max_entries)
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS cache (
+            namespace TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL,
+            expires REAL, written REAL NOT NULL, PRIMARY KEY (namespace, key))""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS cache_written ON cache (written)")
+        self._db.commit()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _get_entry(self, namespace, key):
+        with self._lock:
+            row = self._db.execute("SELECT value, expires FROM cache WHERE namespace = ? AND key = ?",
+                                   (namespace, key)).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return row[1], row[0]
+
+    def _set(self, namespace, key, value, expires):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)",
+                             (namespace, key, value, expires, time.time()))
+            self._writes += 1
+            if self._writes % TRIM_EVERY == 0:
+                self._trim()
+            self._db.commit()
+
+    def _add(self, namespace, key, value, expires):
+        now = time.time()
+        with self._lock:
+            cur = self._db.execute("""INSERT INTO cache VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (namespace, key) DO UPDATE
+                SET value = excluded.value, expires = excluded.expires, written = excluded.written
+                WHERE cache.expires IS NOT NULL AND cache.expires < ?""",
+                                   (namespace, key, value, expires, now, now))
+            self._db.commit()
+            return cur.rowcount == 1
+
+    def _trim(self) -> None:
+        now = time.time()
+        self._db.execute("DELETE FROM cache WHERE expires IS NOT NULL AND expires < ?", (now,))
+        self._db.execute("""DELETE FROM cache WHERE rowid IN (
+            SELECT rowid FROM cache ORDER BY written DESC LIMIT -1 OFFSET ?)""", (self.max_entries,))
+
+    def _delete(self, namespace, key):
+        with self._lock:
+            self._db.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (namespace, key))
+            self._db.commit()
+
+    def _flush(self, namespace):
+        with self._lock:
+            if namespace is None:
+                cur = self._db.execute("DELETE FROM cache")
+            else:
+                cur = self._db.execute("DELETE FROM cache WHERE namespace = ?", (namespace,))
+            self._db.commit()
+            return cur.rowcount
+
+    def _sizes(self):
+        with self._lock:
+            return dict(self._db.execute("SELECT namespace, COUNT(*) FROM cache GROUP BY namespace").fetchall())
+
+
+class PostgresCache(CacheBackend):
+    """Table emily_cache in the app's Postgres, shared across hosts through db_pool"""
+
+    name = "postgres"
+
+    def __init__(self, pool, max_entries: int = CACHE_MAX_ENTRIES):
+        super().__init__(max_entries)
+        self.pool = pool
+        self._writes = 0
+        with pool.connection() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS emily_cache (
+                namespace TEXT NOT NULL, key TEXT NOT NULL, value BYTEA NOT NULL,
+                expires DOUBLE PRECISION, written DOUBLE PRECISION NOT NULL,
+                PRIMARY KEY (namespace, key))""")
+            conn.execute("CREATE INDEX IF NOT EXISTS emily_cache_written ON emily_cache (written)")
+            conn.commit()
+
+    def _get_entry(self, namespace, key):
+        try:
+            with self.pool.connection() as conn:
+                row = conn.execute("SELECT value, expires FROM emily_cache WHERE namespace = %s AND key = %s",
+                                   (namespace, key)).fetchone()
+        except Exception as e:
+            print(f"⚠️ Cache read failed (postgres/{namespace}): {e}")
+            return None
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return row[1], bytes(row[0])
+
+    def _set(self, namespace, key, value, expires):
+        with self.pool.connection() as conn:
+            conn.execute("""INSERT INTO emily_cache VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (namespace, key) DO UPDATE
+                SET value = EXCLUDED.value, expires = EXCLUDED.expires, written = EXCLUDED.written""",
+                         (namespace, key, value, expires, time.time()))
+            self._writes += 1
+            if self._writes % TRIM_EVERY == 0:
+                conn.execute("DELETE FROM emily_cache WHERE expires < %s", (time.time(),))
+                conn.execute("""DELETE FROM emily_cache WHERE (namespace, key) IN (
+                    SELECT namespace, key FROM emily_cache ORDER BY written DESC OFFSET %s)""",
+                             (self.max_entries,))
+            conn.commit()
+
+    def _add(self, namespace, key, value, expires):
+        now = time.time()
+        with self.pool.connection() as conn:
+            cur = conn.execute("""INSERT INTO emily_cache VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (namespace, key) DO UPDATE
+                SET value = EXCLUDED.value, expires = EXCLUDED.expires, written = EXCLUDED.written
+                WHERE emily_cache.expires < %s""",
+                               (namespace, key, value, expires, now, now))
+            conn.commit()
+            return cur.rowcount == 1
+
+    def _delete(self, namespace, key):
+        with self.pool.connection() as conn:
+            conn.execute("DELETE FROM emily_cache WHERE namespace = %s AND key = %s", (namespace, key))
+            conn.commit()
+
+    def _flush(self, namespace):
+        with self.pool.connection() as conn:
+            if namespace is None:
+                cur = conn.execute("DELETE FROM emily_cache")
+            else:
+                cur = conn.execute("DELETE FROM emily_cache WHERE namespace = %s", (namespace,))
+            conn.commit()
+            return cur.rowcount
+
+    def _sizes(self):
+        with self.pool.connection() as conn:
+            return dict(conn.execute("SELECT namespace, COUNT(*) FROM emily_cache GROUP BY namespace").fetchall())
+
+
+class TieredCache(CacheBackend):
+    """A per-worker MemoryCache in front of a shared backend.
+
+    Hits are served from memory when possible and shared-tier hits are
+    copied into it with their expiry; writes go to both. Counters and
+    sizes are the shared tier's, so stats describe what all workers see.
+
+    flush() also writes a fresh generation token for the namespace to the
+    shared tier. Each worker compares the tokens with the ones it last saw
+    at most every generation_check seconds and drops its hot copy of a
+    namespace whose token changed, so a flush on one worker reaches the
+    others within that interval.
+    """
+
+    def __init__(self, shared: CacheBackend, l1_entries: int = CACHE_L1_ENTRIES,
+                 generation_check: float = CACHE_GENERATION_CHECK):
+        super().__init__(shared.max_entries)
+        self.shared = shared
+        self.local = MemoryCache(l1_entries)
+        self.name = f"memory+{shared.name}"
+        self.generation_check = generation_check
+        self._generations: Dict[str, Tuple[float, Optional[bytes], Optional[bytes]]] = {}
+        self._generation_lock = threading.Lock()
+
+    def _check_generation(self, namespace: str) -> None:
+        now = time.monotonic()
+        with self._generation_lock:
+            seen = self._generations.get(namespace)
+            if seen is not None and now - seen[0] < self.generation_check:
+                return
+        # "*" is bumped by flush(None) and applies to every namespace
+        tokens = (self.shared._get(GENERATION_NAMESPACE, namespace), self.shared._get(GENERATION_NAMESPACE, "*"))
+        with self._generation_lock:
+            self._generations[namespace] = (now,) + tokens
+        if seen is not None and seen[1:] != tokens:
+            self.local._flush(namespace)
+
+    def get_entry(self, namespace, key):
+        self._check_generation(namespace)
+        entry = self.local._get_entry(namespace, key)
+        if entry is not None:
+            self.shared._count(namespace, "hits")
+            return entry
+        entry = self.shared.get_entry(namespace, key)
+        if entry is not None:
+            self.local._set(namespace, key, entry[1], entry[0])
+        return entry
+
+    def set(self, namespace, key, value, ttl=None):
+        # The hot copy keeps the shared TTL so both tiers expire together
+        self.local._set(namespace, key, bytes(value), time.time() + ttl if ttl else None)
+        self.shared.set(namespace, key, value, ttl)
+
+    def add(self, namespace, key, value, ttl=None):
+        # Only the shared tier can arbitrate between workers
+        return self.shared.add(namespace, key, value, ttl)
+
+    def delete(self, namespace, key):
+        self.local._delete(namespace, key)
+        self.shared.delete(namespace, key)
+
+    def flush(self, namespace=None):
+        self.local._flush(namespace)
+        removed = self.shared.flush(namespace)
+        self.shared._set(GENERATION_NAMESPACE, namespace or "*", uuid.uuid4().bytes, None)
+        return removed
+
+    def stats(self):
+        stats = self.shared.stats()
+        stats.pop(GENERATION_NAMESPACE, None)
+        return stats
+
+
+_shared: Optional[CacheBackend] = None
+_shared_lock = threading.Lock()
+
+
+def configure_shared_cache(backend: CacheBackend) -> CacheBackend:
+    """Install the process-wide cache that every cache layer stores into"""
+    global _shared
+    with _shared_lock:
+        _shared = backend
+    print(f"🗃️  Shared cache backend: {backend.name}")
+    return backend
+
+
+def make_cache_backend(kind: str = CACHE_BACKEND, pool=None) -> CacheBackend:
+    """Backend for kind, fronted by a per-worker LRU when it is shared"""
+    if kind == "memory":
+        return MemoryCache()
+    if kind == "sqlite":
+        return TieredCache(SQLiteCache())
+    if kind == "postgres":
+        if pool is None:
+            raise ValueError("CACHE_BACKEND=postgres needs a database pool (DATABASE_URL)")
+        return TieredCache(PostgresCache(pool))
+    raise ValueError(f"Unknown CACHE_BACKEND {kind!r}; expected memory, sqlite or postgres")
+
+
+def shared_cache() -> CacheBackend:
+    """The configured shared cache, defaulting to CACHE_BACKEND (memory if that needs a pool)"""
+    global _shared
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                _shared = make_cache_backend("memory" if CACHE_BACKEND == "postgres" else CACHE_BACKEND)
+    return _shared
@@ -0,0 +1,217 @@
+# cache_warmup.py
+"""Replay the most frequent recent questions through the answer pipeline to fill the caches"""
+
+import os
+import json
+import time
+import tempfile
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from embedding_cache import normalise_query
+
+TRAFFIC_LOG = os.getenv("TRAFFIC_LOG")  # JSON lines of asked questions; warm-up reads it instead of the DB
+CACHE_WARMUP_QUESTIONS = int(os.getenv("CACHE_WARMUP_QUESTIONS", "50"))  # per school and language
+CACHE_WARMUP_DAYS = int(os.getenv("CACHE_WARMUP_DAYS", "30"))
+CACHE_WARMUP_CONCURRENCY = int(os.getenv("CACHE_WARMUP_CONCURRENCY", "4"))
+CACHE_WARMUP_SECONDS = float(os.getenv("CACHE_WARMUP_SECONDS", "120"))  # stop starting new questions after this
+CACHE_WARMUP_LOCK = os.getenv("CACHE_WARMUP_LOCK", os.path.join(tempfile.gettempdir(), "emily_cache_warmup.lock"))
+
+_log_lock = threading.Lock()
+
+
+class WarmupQuestion(NamedTuple):
+    school: Optional[str]  # None is the default school
+    language: str
+    question: str
+    endpoint: str          # route it was asked on, e.g. /ask-with-tools
+    count: int
+
+
+def record_question(school: str, language: str, question: str, endpoint: str,
+                    path: Optional[str] = TRAFFIC_LOG) -> None:
+    """Append one asked question to the traffic log, if TRAFFIC_LOG is set"""
+    if not path:
+        return
+    line = json.dumps({"ts": time.time(), "school": school, "language": language,
+                       "endpoint": endpoint, "question": question}, ensure_ascii=False)
+    try:
+        with _log_lock, open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    except OSError as e:
+        print(f"⚠️ Could not write traffic log {path}: {e}")
+
+
+def _top(counts: Counter, limit: int) -> List[WarmupQuestion]:
+    per_group: Dict[tuple, int] = {}
+    out = []
+    for (school, language, endpoint, question), count in counts.most_common():
+        taken = per_group.get((school, language), 0)
+        if taken < limit:
+            per_group[(school, language)] = taken + 1
+            out.append(WarmupQuestion(school, language, question, endpoint, count))
+    return out
+
+
+def questions_from_log(path: str, limit: int = CACHE_WARMUP_QUESTIONS,
+                       days: int = CACHE_WARMUP_DAYS) -> List[WarmupQuestion]:
+    """Most frequent questions per (school, language) in the traffic log"""
+    since = time.time() - days * 86400
+    counts: Counter = Counter()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            question = normalise_query(entry.get("question") or "")
+            if question and entry.get("ts", 0) >= since:
+                counts[(entry.get("school"), entry.get("language") or "en",
+                        entry.get("endpoint") or "/ask", question)] += 1
+    return _top(counts, limit)
+
+
+def questions_from_db(pool, limit: int = CACHE_WARMUP_QUESTIONS,
+                      days: int = CACHE_WARMUP_DAYS) -> List[WarmupQuestion]:
+    """Most frequent questions per (school, language) in chat_interactions.
+
+    Only /ask logs there (for families), so these replay through /ask.
+    """
+    sql = """
+    SELECT school, language, question, n FROM (
+      SELECT metadata::jsonb ->> 'school'                  AS school,
+             COALESCE(metadata::jsonb ->> 'language', 'en') AS language,
+             lower(trim(question))                          AS question,
+             count(*)                                       AS n,
+             row_number() OVER (PARTITION BY metadata::jsonb ->> 'school',
+                                             COALESCE(metadata::jsonb ->> 'language', 'en')
+                                ORDER BY count(*) DESC)     AS rank
+      FROM chat_interactions
+      WHERE timestamp > now() - %s * interval '1 day'
+      GROUP BY 1, 2, 3
+    ) ranked
+    WHERE rank <= %s
+    ORDER BY n DESC;
+    """
+    with pool.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, (days, limit))
+            rows = cur.fetchall()
+    counts: Counter = Counter()
+    for school, language, question, n in rows:
+        question = normalise_query(question or "")
+        if question:
+            counts[(school, language, "/ask", question)] += n
+    return _top(counts, limit)
+
+
+def load_warmup_questions(pool=None, path: Optional[str] = TRAFFIC_LOG,
+                          limit: int = CACHE_WARMUP_QUESTIONS) -> List[WarmupQuestion]:
+    """From the traffic log if there is one, else chat_interactions, else nothing"""
+    try:
+        if path and os.path.exists(path):
+            return questions_from_log(path, limit)
+        if pool is not None:
+            return questions_from_db(pool, limit)
+    except Exception as e:
+        print(f"⚠️ Could not read warm-up questions: {e}")
+    return []
+
+
+def warm_caches(questions: List[WarmupQuestion], answer: Callable[[WarmupQuestion], None],
+                concurrency: int = CACHE_WARMUP_CONCURRENCY,
+                budget: float = CACHE_WARMUP_SECONDS) -> Dict[str, int]:
+    """Run answer(q) for each question, at most concurrency at once.
+
+    answer() is expected to go through the normal pipeline so every cache
+    it touches (embeddings, answers, translations) is filled. Questions not
+    started within budget seconds are skipped; failures are counted and
+    otherwise ignored.
+    """
+    deadline = time.monotonic() + budget
+    stats = {"answered": 0, "failed": 0, "skipped": 0}
+    lock = threading.Lock()
+
+    def run(q: WarmupQuestion) -> None:
+        if time.monotonic() > deadline:
+            outcome = "skipped"
+        else:
+            try:
+                answer(q)
+                outcome = "answered"
+            except Exception as e:
+                print(f"⚠️ Warm-up failed for '{q.question}' ({q.language}): {e}")
+                outcome = "failed"
+        with lock:
+            stats[outcome] += 1
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="warmup") as pool:
+        list(pool.map(run, questions))
+    print(f"🔥 Cache warm-up: {stats['answered']} answered, {stats['failed']} failed, "
+          f"{stats['skipped']} skipped in {time.monotonic() - started:.1f}s")
+    return stats
+
+
+class WarmupElection:
+    """Lock file that lets one worker per deploy (on this host) replay.
+
+    deploy identifies the worker set, e.g. the deployed commit or KB build
+    together with the gunicorn master's pid; it must not contain spaces. The
+    first worker to claim() writes "<deploy> running" and replays; the
+    others see their own deploy in the file, skip the replay and wait()
+    until the leader marks it "done", then read its answers from the
+    shared cache. A file from an earlier deploy is replaced.
+    """
+
+    def __init__(self, deploy: str, path: str = CACHE_WARMUP_LOCK):
+        self.deploy = deploy
+        self.path = path
+
+    def _read(self) -> Optional[str]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def _write(self, state: str) -> str:
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(f"{self.deploy} {state}")
+        return tmp
+
+    def claim(self) -> bool:
+        """True if this worker should replay; False if another worker of the deploy already is"""
+        tmp = self._write("running")
+        try:
+            for _ in range(2):
+                try:
+                    # link() fails if the lock exists, and never exposes a half-written file
+                    os.link(tmp, self.path)
+                    return True
+                except FileExistsError:
+                    current = self._read()
+                    if current is not None and current.split(" ")[0] == self.deploy:
+                        return False
+                    try:
+                        os.remove(self.path)
+                    except FileNotFoundError:
+                        pass
+            return False
+        finally:
+            os.remove(tmp)
+
+    def finish(self) -> None:
+        os.replace(self._write("done"), self.path)
+
+    def wait(self, timeout: float = CACHE_WARMUP_SECONDS + 60) -> bool:
+        """Block until the leader is done; False if it did not finish within timeout"""
+        deadline = time.monotonic() + timeout
+        while self._read() == f"{self.deploy} running":
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(1)
+        return True
@@ -0,0 +1,197 @@
+# chunk_store.py
+"""Columnar store for knowledge base chunk metadata"""
+
+import os
+from typing import Any, Dict, Iterator, List, Optional
+from urllib.parse import urlparse
+
+import numpy as np
+
+# Repeated short strings are interned into a table and stored as int32 codes
+INTERNED_FIELDS = ("source", "url", "label")
+
+KB_TEXT_FILE = "kb_text.npy"
+KB_OFFSETS_FILE = "kb_offsets.npy"
+KB_CODES_FILE = "kb_codes.npy"
+
+DOC_TYPES = ("pdf", "html")
+MAX_CACHED_FILTERS = 256
+
+# Rough UTF-8 bytes per model token: ~4 for English, and close to one
+# token per 3-byte CJK character, so one ratio serves every language
+BYTES_PER_TOKEN = 4
+
+
+class ChunkView:
+    """Read-only view of one chunk; text is decoded only when asked for"""
+
+    __slots__ = ("_store", "_row")
+
+    def __init__(self, store: "ChunkStore", row: int):
+        self._store = store
+        self._row = row
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._store.field(self._row, key, default)
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {k: v for k in ("text",) + INTERNED_FIELDS if (v := self.get(k)) is not None}
+
+    def __repr__(self) -> str:
+        return f"ChunkView({self._row}, source={self.get('source')!r})"
+
+
+class ChunkStore:
+    """Chunk metadata held as one UTF-8 buffer plus interned field tables.
+
+    Text lives in a single uint8 array sliced by an offsets array, and
+    source/url/label are int32 codes into small string tables, so the
+    per-chunk cost is a few integers rather than a dict of Python strings.
+    The arrays may be memory-mapped from disk.
+    """
+
+    def __init__(self, text: np.ndarray, offsets: np.ndarray, codes: np.ndarray,
+                 tables: Dict[str, List[str]]):
+        if offsets.shape[0] != codes.shape[0] + 1:
+            raise ValueError(f"offsets has {offsets.shape[0]} entries for {codes.shape[0]} chunks")
+        self.text = text
+        self.offsets = offsets
+        self.codes = codes
+        self.tables = tables
+        self._columns = {name: i for i, name in enumerate(INTERNED_FIELDS)}
+        self._filter_cache: Dict[tuple, np.ndarray] = {}
+        # Estimated prompt tokens per chunk, for packing contexts to a budget
+        self.token_counts = (np.diff(np.asarray(offsets)) + BYTES_PER_TOKEN - 1) // BYTES_PER_TOKEN
+        # Document type is a property of the source, so its masks come from
+        # the (small) source table rather than a pass over every chunk
+        pdf_codes = [i for i, src in enumerate(tables.get("source", [])) if _is_pdf(src)]
+        self._doc_type_masks = {"pdf": np.isin(self.column("source"), pdf_codes)}
+        self._doc_type_masks["html"] = ~self._doc_type_masks["pdf"]
+
+    @classmethod
+    def from_chunks(cls, chunks: List[Dict[str, Any]]) -> "ChunkStore":
+        encoded = [(chunk.get("text") or "").encode("utf-8") for chunk in chunks]
+        offsets = np.zeros(len(chunks) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        text = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+        tables: Dict[str, List[str]] = {name: [] for name in INTERNED_FIELDS}
+        lookup: Dict[str, Dict[str, int]] = {name: {} for name in INTERNED_FIELDS}
+        codes = np.full((len(chunks), len(INTERNED_FIELDS)), -1, dtype=np.int32)
+        for row, chunk in enumerate(chunks):
+            for col, name in enumerate(INTERNED_FIELDS):
+                value = chunk.get(name)
+                if value is None:
+                    continue
+                code = lookup[name].get(value)
+                if code is None:
+                    code = lookup[name][value] = len(tables[name])
+                    tables[name].append(value)
+                codes[row, col] = code
+        return cls(text, offsets, codes, tables)
+
+    def __len__(self) -> int:
+        return self.codes.shape[0]
+
+    def __getitem__(self, row: int) -> ChunkView:
+        row = int(row)
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        return ChunkView(self, row)
+
+    def __iter__(self) -> Iterator[ChunkView]:
+        for row in range(len(self)):
+            yield ChunkView(self, row)
+
+    def field(self, row: int, key: str, default: Any = None) -> Any:
+        if key == "text":
+            start, end = self.offsets[row], self.offsets[row + 1]
+            return self.text[start:end].tobytes().decode("utf-8")
+        col = self._columns.get(key)
+        if col is None:
+            return default
+        code = self.codes[row, col]
+        return self.tables[key][code] if code >= 0 else default
+
+    def column(self, key: str) -> np.ndarray:
+        return self.codes[:, self._columns[key]]
+
+    # ── Filtering ───────────────────────────────────────────────────────
+    def _prefix_mask(self, prefix: str) -> np.ndarray:
+        # Prefix is matched against the table of distinct URLs, then mapped
+        # to rows with one vectorised isin per column
+        mask = np.zeros(len(self), dtype=bool)
+        for key in ("source", "url"):
+            codes = [i for i, u in enumerate(self.tables.get(key, [])) if _url_matches(u, prefix)]
+            if codes:
+                mask |= np.isin(self.column(key), codes)
+        return mask
+
+    def filter_rows(self, source_prefix: Optional[str] = None, doc_type: Optional[str] = None,
+                    label: Optional[str] = None) -> Optional[np.ndarray]:
+        """Sorted row ids matching every given filter, or None when no filter is set.
+
+        source_prefix matches a URL path ("/admissions/") or a full URL
+        prefix; doc_type is "pdf" or "html"; label is an exact label.
+        Results are memoised per filter combination.
+        """
+        if not (source_prefix or doc_type or label):
+            return None
+        key = (source_prefix, doc_type, label)
+        rows = self._filter_cache.get(key)
+        if rows is not None:
+            return rows
+
+        mask = np.ones(len(self), dtype=bool)
+        if source_prefix:
+            mask &= self._prefix_mask(source_prefix)
+        if doc_type:
+            if doc_type not in DOC_TYPES:
+                raise ValueError(f"Unknown doc_type {doc_type!r}; expected one of {DOC_TYPES}")
+            mask &= self._doc_type_masks[doc_type]
+        if label:
+            labels = self.tables.get("label", [])
+            code = labels.index(label) if label in labels else -2
+            mask &= self.column("label") == code
+
+        rows = np.flatnonzero(mask)
+        if len(self._filter_cache) >= MAX_CACHED_FILTERS:
+            self._filter_cache.clear()
+        self._filter_cache[key] = rows
+        return rows
+
+    # ── Persistence ─────────────────────────────────────────────────────
+    def save(self, folder: str, write_fn) -> Dict[str, List[str]]:
+        """Write the arrays with write_fn(path, array); return the tables for the sidecar"""
+        write_fn(os.path.join(folder, KB_TEXT_FILE), np.asarray(self.text))
+        write_fn(os.path.join(folder, KB_OFFSETS_FILE), np.asarray(self.offsets))
+        write_fn(os.path.join(folder, KB_CODES_FILE), np.asarray(self.codes))
+        return self.tables
+
+    @classmethod
+    def load(cls, folder: str, tables: Dict[str, List[str]], mmap_mode: Optional[str] = "r") -> "ChunkStore":
+        text = np.load(os.path.join(folder, KB_TEXT_FILE), mmap_mode=mmap_mode)
+        offsets = np.load(os.path.join(folder, KB_OFFSETS_FILE), mmap_mode=mmap_mode)
+        codes = np.load(os.path.join(folder, KB_CODES_FILE), mmap_mode=mmap_mode)
+        return cls(text, offsets, codes, {name: tables.get(name, []) for name in INTERNED_FIELDS})
+
+
+def _is_pdf(url: str) -> bool:
+    return urlparse(url).path.lower().endswith(".pdf")
+
+
+def _url_matches(url: str, prefix: str) -> bool:
+    if prefix.startswith(("http://", "https://")):
+        return url.startswith(prefix)
+    return urlparse(url).path.startswith(prefix)
@@ -0,0 +1,91 @@
+# context_builder.py
+"""Pack retrieved chunks into a RAG prompt under a similarity cut-off and token budget"""
+
+import os
+from typing import List, Sequence
+
+from chunk_store import BYTES_PER_TOKEN
+from lexical_index import TOKEN_RE, tokenize
+
+RAG_MIN_SCORE = float(os.getenv("RAG_MIN_SCORE", "0.3"))           # drop weaker hits after the first
+RAG_CONTEXT_TOKENS = int(os.getenv("RAG_CONTEXT_TOKENS", "2500"))  # budget for all passages
+RAG_CHUNK_TOKENS = int(os.getenv("RAG_CHUNK_TOKENS", "600"))       # longer chunks are cut to their best span
+SNAP_CHARS = 40  # how far to look for a word boundary when cutting
+
+
+def estimate_tokens(text: str) -> int:
+    """Same estimate as ChunkStore.token_counts, for text that isn't in the store"""
+    return (len(text.encode("utf-8")) + BYTES_PER_TOKEN - 1) // BYTES_PER_TOKEN
+
+
+def best_span(text: str, query: str, max_chars: int) -> str:
+    """The max_chars window of text holding the most query terms, cut at word boundaries.
+
+    Falls back to the start of the text when no query term occurs in it.
+    Cut ends are marked with an ellipsis.
+    """
+    if len(text) <= max_chars:
+        return text
+    terms = set(tokenize(query))
+    positions = [m.start() for m in TOKEN_RE.finditer(text.lower()) if m.group() in terms]
+
+    start = 0
+    if positions:
+        # Sliding window over the sorted hit positions
+        best, j = 0, 0
+        for i, pos in enumerate(positions):
+            while j < len(positions) and positions[j] < pos + max_chars:
+                j += 1
+            if j - i > best:
+                best, start = j - i, pos
+        # Give the first hit some lead-in rather than starting on it
+        start = max(0, min(start - max_chars // 4, len(text) - max_chars))
+    end = start + max_chars
+
+    if start > 0:
+        space = text.find(" ", start, start + SNAP_CHARS)
+        if space != -1:
+            start = space + 1
+    if end < len(text):
+        space = text.rfind(" ", end - SNAP_CHARS, end)
+        if space > start:
+            end = space
+    return ("…" if start > 0 else "") + text[start:end].strip() + ("…" if end < len(text) else "")
+
+
+def build_context(chunks, scores: Sequence[float], idxs: Sequence[int], query: str,
+                  min_score: float = RAG_MIN_SCORE, token_budget: int = RAG_CONTEXT_TOKENS,
+                  chunk_tokens: int = RAG_CHUNK_TOKENS, max_chunks: int = 10) -> List[str]:
+    """Passage texts for the prompt, best first.
+
+    Hits scoring below min_score are dropped, except the top hit, which the
+    caller has already chosen to answer from. Chunks over chunk_tokens are
+    cut to the span around the query terms, and passages are added until
+    token_budget is spent; a passage that doesn't fit is skipped so a
+    shorter one further down can still use the room.
+
+    min_score is a cosine threshold, so it only suits vector-only
+    retrieval: hybrid hits that BM25 contributed can score low on cosine
+    and still be the answer. On the lexical fallback the scores are BM25
+    and almost always clear it.
+    """
+    token_counts = chunks.token_counts
+    contexts: List[str] = []
+    used = 0
+    for rank, (score, i) in enumerate(zip(scores, idxs)):
+        if len(contexts) >= max_chunks:
+            break
+        if rank > 0 and score < min_score:
+            continue
+        text = chunks[i].get("text", "")
+        tokens = int(token_counts[i])
+        if tokens > chunk_tokens:
+            # Convert the token cap to characters at this chunk's own ratio
+            text = best_span(text, query, max(1, int(len(text) * chunk_tokens / tokens)))
+            tokens = estimate_tokens(text)
+        if contexts and used + tokens > token_budget:
+            continue
+        contexts.append(text)
+        used += tokens
+    print(f"🧩 Context: {len(contexts)} of {len(idxs)} passages, ~{used} tokens")
+    return contexts
@@ -1,5 +1,5 @@
 from static_qa_config import STATIC_QA_LIST  # Import the correct list
-from difflib import SequenceMatcher
+from static_qa_index import FuzzyMatcher
 
 RELATED_TOPICS = {
     # Financial
@@ -65,33 +65,38 @@ VISIT_INTENT_TOPICS = {
     'location', 'facilities', 'virtual tour', 'subjects', 'pastoral care'
 }
 
-def get_suggestions(user_input, language='en', max_buttons=6):
+_matchers = {}  # id(qa_list) -> (qa_list, FuzzyMatcher) for callers that don't pass one
+
+
+def _matcher_for(qa_list):
+    cached = _matchers.get(id(qa_list))
+    if cached is None or cached[0] is not qa_list:
+        cached = _matchers[id(qa_list)] = (qa_list, FuzzyMatcher(qa_list))
+    return cached[1]
+
+
+def get_suggestions(user_input, language='en', max_buttons=6, qa_list=None, matcher=None):
     """Generate contextual button suggestions based on user input
 
     Args:
         user_input: The user's question or matched topic key
         language: Language code (en, fr, es, de, zh)
         max_buttons: Maximum number of buttons to return (default 6)
+        qa_list: Static Q&A entries to match against (default STATIC_QA_LIST)
+        matcher: FuzzyMatcher over qa_list (built and kept on first use if omitted)
 
     Returns:
         List of button dicts with 'label' and 'query' keys
     """
+    qa_list = qa_list if qa_list is not None else STATIC_QA_LIST
+    matcher = matcher or _matcher_for(qa_list)
     user_input = user_input.lower()
-    best_score = 0
-    best_key = None
 
     print(f"🔍 get_suggestions called with: '{user_input}' | Language: {language}")
 
     # Fuzzy match the input to known keys/variants
-    for qa in STATIC_QA_LIST:
-        if qa['language'] != language:
-            continue
-        variants = [qa['key']] + qa.get('variants', [])
-        for variant in variants:
-            score = SequenceMatcher(None, user_input, variant.lower()).ratio()
-            if score > best_score:
-                best_score = score
-                best_key = qa['key']
+    best_qa, best_score = matcher.best(language, user_input)
+    best_key = best_qa['key'] if best_qa else None
 
     print(f"🎯 Best match: '{best_key}' with score {best_score:.2f}")
 
@@ -125,7 +130,7 @@ def get_suggestions(user_input, language='en', max_buttons=6):
     buttons = []
     for key in final_keys:
         # Find the matching QA entry
-        match = next((q for q in STATIC_QA_LIST if q['key'] == key and q['language'] == language), None)
+        match = next((q for q in qa_list if q['key'] == key and q['language'] == language), None)
         if match:
             # Use the 'label' field if it exists, otherwise use the key
             label = match.get('label', key.title())
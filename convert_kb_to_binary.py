@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Convert kb_chunks/kb_chunks.pkl into the memory-mapped binary KB format
+(a builds/<id>/ directory named by kb_meta.json) that app.py prefers at startup.
+
+The build records the model and width of the configured embedding backend
+(EMBEDDING_BACKEND), which must be the one that embedded the pickle. Set
+EMBEDDING_DIMENSIONS (e.g. 256 or 512) to truncate existing text-embedding-3
+vectors to a smaller index without re-embedding.
+"""
+import sys
+import pickle
+
+from knowledge_index import save_binary_kb, KB_BUILDS_DIR, KB_META_FILE
+from embedding_backends import get_backend
+
+KB_FOLDER = "kb_chunks"
+pkl_path = sys.argv[1] if len(sys.argv) > 1 else f"{KB_FOLDER}/kb_chunks.pkl"
+
+with open(pkl_path, "rb") as f:
+    kb_chunks = pickle.load(f)
+
+print(f"📚 Loaded {len(kb_chunks)} chunks from {pkl_path}")
+
+backend = get_backend()
+build = save_binary_kb(kb_chunks, KB_FOLDER, dim=backend.dimensions, model=backend.model)
+
+print(f"✅ Wrote {KB_FOLDER}/{KB_BUILDS_DIR}/{build} and {KB_FOLDER}/{KB_META_FILE} "
+      f"({backend.model}, {backend.dimensions} dims)")
@@ -7,13 +7,17 @@ import numpy as np
 from urllib.parse import urljoin, urlparse
 from bs4 import BeautifulSoup
 from PyPDF2 import PdfReader
-from openai import OpenAI
 from dotenv import load_dotenv
 import tiktoken
 
+from knowledge_index import save_binary_kb
+from embedding_backends import build_local_index, get_backend
+from static_qa_config import STATIC_QA_LIST
+from static_qa_vectors import build_static_qa_vectors
+
 # ─── Setup ──────────────────────────────────────────────
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+backend = get_backend()  # EMBEDDING_BACKEND=local builds without network
 
 BASE_DOMAIN = "www.morehouse.org.uk"
 START_URLS = [
@@ -49,11 +53,7 @@ def extract_clean_text(html):
 
 # ─── Embed a Chunk ─────────────────────────────────────
 def get_embedding(text):
-    response = client.embeddings.create(
-        model="text-embedding-3-small",
-        input=[text]
-    )
-    return response.data[0].embedding
+    return backend.embed_one(text)
 
 # ─── URL Validity Check ────────────────────────────────
 def is_valid_url(url):
@@ -133,7 +133,7 @@ with open("metadata.pkl", "wb") as f:
     pickle.dump(all_chunks, f)
 
 with open("embeddings.pkl", "wb") as f:
-    pickle.dump(np.array(all_embeddings), f)
+    pickle.dump(np.array(all_embeddings, dtype=np.float32), f)
 
 # Combine and save to kb_chunks.pkl
 kb_chunks = []
@@ -146,4 +146,8 @@ os.makedirs("kb_chunks", exist_ok=True)
 with open("kb_chunks/kb_chunks.pkl", "wb") as f:
     pickle.dump(kb_chunks, f)
 
+save_binary_kb(kb_chunks, "kb_chunks", dim=backend.dimensions, model=backend.model)
+build_local_index("kb_chunks", [chunk["text"] for chunk in kb_chunks])
+build_static_qa_vectors("kb_chunks", STATIC_QA_LIST, backend)
+
 print(f"\n✅ Done: {len(kb_chunks)} total chunks embedded and saved.")
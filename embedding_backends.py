@@ -0,0 +1,234 @@
+# embedding_backends.py
+"""Embedding backends: OpenAI, plus a local hashed n-gram model for offline use"""
+
+import os
+import json
+from typing import Dict, List, Optional, Sequence, Type
+
+import numpy as np
+
+from lexical_index import STOPWORDS
+from knowledge_index import (
+    KnowledgeIndex, EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, embedding_request, normalise_rows,
+    has_binary_kb, load_binary_kb, _atomic_write, _save_npy,
+)
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai")  # openai | local
+
+# ── Local fallback index ────────────────────────────────────────────────
+# Built from the KB texts by build_local_index.py. Rows line up with
+# kb_vectors.npy, so hits index the same ChunkStore.
+LOCAL_EMBEDDING_DIMENSIONS = int(os.getenv("LOCAL_EMBEDDING_DIMENSIONS", "256"))
+KB_LOCAL_VECTORS_FILE = "kb_local_vectors.npy"
+KB_LOCAL_IDF_FILE = "kb_local_idf.npy"
+KB_LOCAL_META_FILE = "kb_local_meta.json"
+
+HASH_FEATURES = 2 ** 14   # hashed n-gram buckets
+NGRAM_RANGE = (2, 4)      # character n-gram sizes; bigrams carry most of the signal in zh
+MAX_EMBED_CHARS = 8000    # long chunks are represented by their opening text
+_HASH_PRIME = np.uint64(1099511628211)
+_HASH_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+class EmbeddingBackend:
+    """Turns texts into unit-length float32 rows"""
+
+    name = "base"
+
+    def __init__(self, dimensions: int):
+        self.dimensions = dimensions
+
+    @property
+    def model(self) -> str:
+        """Identifier stored with vectors and cache entries made by this backend"""
+        return self.name
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        raise NotImplementedError
+
+    def embed_one(self, text: str) -> np.ndarray:
+        return self.embed([text])[0]
+
+
+class OpenAIBackend(EmbeddingBackend):
+    name = "openai"
+
+    def __init__(self, client=None, model: str = EMBEDDING_MODEL, dimensions: int = EMBEDDING_DIMENSIONS,
+                 timeout: Optional[float] = None):
+        super().__init__(dimensions)
+        if client is None:
+            from openai import OpenAI
+            client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.client = client
+        self._model = model
+        self.timeout = timeout
+
+    @property
+    def model(self) -> str:
+        return self._model
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        request = embedding_request([t.strip() for t in texts])
+        request["model"], request["dimensions"] = self._model, self.dimensions
+        resp = self.client.embeddings.create(**request, timeout=self.timeout)
+        ordered = sorted(resp.data, key=lambda d: d.index)
+        return np.array([d.embedding for d in ordered], dtype=np.float32)
+
+
+class HashingBackend(EmbeddingBackend):
+    """Hashed character n-gram TF-IDF, reduced by a fixed random projection.
+
+    Needs only NumPy and no network, so it can serve queries while the
+    embeddings API is down and lets benchmarks and tests run offline. The
+    projection is seeded, so every process maps text to the same vectors.
+    idf comes from fit() over the KB texts; without it all n-grams weigh
+    the same.
+    """
+
+    name = "local"
+
+    def __init__(self, dimensions: int = LOCAL_EMBEDDING_DIMENSIONS, n_features: int = HASH_FEATURES,
+                 ngram_range=NGRAM_RANGE, idf: Optional[np.ndarray] = None, seed: int = 0):
+        super().__init__(dimensions)
+        self.n_features = n_features
+        self.ngram_range = tuple(ngram_range)
+        self.idf = idf
+        self.seed = seed
+        self._projection: Optional[np.ndarray] = None
+
+    @property
+    def model(self) -> str:
+        lo, hi = self.ngram_range
+        return f"local-hash-{self.n_features}-{lo}{hi}-{self.seed}"
+
+    @property
+    def projection(self) -> np.ndarray:
+        if self._projection is None:
+            rng = np.random.default_rng(self.seed)
+            self._projection = (rng.standard_normal((self.n_features, self.dimensions), dtype=np.float32)
+                                / np.float32(np.sqrt(self.dimensions)))
+        return self._projection
+
+    def features(self, text: str) -> np.ndarray:
+        """Hash bucket of every character n-gram in text (with repeats), stopwords removed"""
+        words = (w for w in text.casefold().split() if w.strip("?!.,;:") not in STOPWORDS)
+        text = f" {' '.join(words)[:MAX_EMBED_CHARS]} "
+        chars = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+        buckets = []
+        lo, hi = self.ngram_range
+        for n in range(lo, hi + 1):
+            count = len(chars) - n + 1
+            if count <= 0:
+                continue
+            h = np.full(count, n, dtype=np.uint64)
+            for j in range(n):
+                h = h * _HASH_PRIME + chars[j:j + count]
+            buckets.append((h * _HASH_MIX >> np.uint64(40)) % np.uint64(self.n_features))
+        if not buckets:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(buckets).astype(np.int64)
+
+    def fit(self, texts) -> "HashingBackend":
+        """Set idf from document frequencies over texts"""
+        df = np.zeros(self.n_features, dtype=np.int64)
+        n_docs = 0
+        for text in texts:
+            df[np.unique(self.features(text))] += 1
+            n_docs += 1
+        self.idf = (np.log((1 + n_docs) / (1 + df)) + 1).astype(np.float32)
+        # N-grams never seen in the KB can't match anything; they'd only add
+        # projection noise to query vectors
+        self.idf[df == 0] = 0
+        return self
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        projection = self.projection
+        for i, text in enumerate(texts):
+            buckets, counts = np.unique(self.features(text), return_counts=True)
+            if len(buckets) == 0:
+                continue
+            weights = 1 + np.log(counts.astype(np.float32))  # sublinear tf
+            if self.idf is not None:
+                weights *= self.idf[buckets]
+            out[i] = weights @ projection[buckets]
+        return normalise_rows(out)
+
+
+BACKENDS: Dict[str, Type[EmbeddingBackend]] = {
+    OpenAIBackend.name: OpenAIBackend,
+    HashingBackend.name: HashingBackend,
+}
+
+
+def get_backend(name: Optional[str] = None, **kwargs) -> EmbeddingBackend:
+    """The configured primary backend (EMBEDDING_BACKEND) or the one named.
+
+    The primary backend embeds both the KB and the queries. Unless told
+    otherwise, each backend uses its own width: EMBEDDING_DIMENSIONS for
+    openai and LOCAL_EMBEDDING_DIMENSIONS for local, whose projection
+    matrix grows with it. Builds record the width in kb_meta.json.
+    """
+    name = name or EMBEDDING_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend {name!r}; expected one of {tuple(BACKENDS)}")
+    return BACKENDS[name](**kwargs)
+
+
+# ── Local fallback index ────────────────────────────────────────────────
+class LocalIndex:
+    """A HashingBackend and the KB rows embedded with it"""
+
+    def __init__(self, backend: HashingBackend, index: KnowledgeIndex):
+        self.backend = backend
+        self.index = index
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self.backend.embed_one(text)
+
+
+def build_local_index(folder: str, texts: Optional[List[str]] = None,
+                      dimensions: int = LOCAL_EMBEDDING_DIMENSIONS, batch: int = 256) -> LocalIndex:
+    """Fit and write the local fallback index for the KB in folder.
+
+    texts default to the chunk texts of the binary KB in folder, in row order.
+    """
+    if texts is None:
+        if not has_binary_kb(folder):
+            raise FileNotFoundError(f"No binary KB in {folder}; run convert_kb_to_binary.py first")
+        _, store = load_binary_kb(folder)
+        texts = [chunk.get("text", "") for chunk in store]
+    backend = HashingBackend(dimensions=dimensions).fit(texts)
+    vectors = np.empty((len(texts), dimensions), dtype=np.float32)
+    for start in range(0, len(texts), batch):
+        vectors[start:start + batch] = backend.embed(texts[start:start + batch])
+
+    _save_npy(os.path.join(folder, KB_LOCAL_VECTORS_FILE), vectors)
+    _save_npy(os.path.join(folder, KB_LOCAL_IDF_FILE), backend.idf)
+
+    def write_meta(path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"count": len(texts), "dim": dimensions, "model": backend.model,
+                       "n_features": backend.n_features, "ngram_range": list(backend.ngram_range),
+                       "seed": backend.seed}, f)
+
+    _atomic_write(os.path.join(folder, KB_LOCAL_META_FILE), write_meta)
+    return LocalIndex(backend, KnowledgeIndex(vectors, normalised=True))
+
+
+def load_local_index(folder: str, expected_rows: Optional[int] = None) -> Optional[LocalIndex]:
+    """Open the local fallback index, or None if it hasn't been built or is stale"""
+    meta_path = os.path.join(folder, KB_LOCAL_META_FILE)
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if expected_rows is not None and meta["count"] != expected_rows:
+        print(f"⚠️ Local index has {meta['count']} rows but the KB has {expected_rows}; "
+              "rebuild it with build_local_index.py")
+        return None
+    backend = HashingBackend(dimensions=meta["dim"], n_features=meta["n_features"],
+                             ngram_range=meta["ngram_range"], seed=meta["seed"],
+                             idf=np.load(os.path.join(folder, KB_LOCAL_IDF_FILE)))
+    vectors = np.load(os.path.join(folder, KB_LOCAL_VECTORS_FILE), mmap_mode="r")
+    return LocalIndex(backend, KnowledgeIndex(vectors, normalised=True))
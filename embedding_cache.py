@@ -0,0 +1,77 @@
+# embedding_cache.py
+"""Query embedding cache on the shared cache backend"""
+
+import os
+import re
+import hashlib
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from cache_backend import CacheBackend, shared_cache
+from knowledge_index import EMBEDDING_MODEL, EMBEDDING_DIMENSIONS
+
+EMBED_CACHE_TTL = float(os.getenv("EMBED_CACHE_TTL", "0")) or None  # seconds; vectors don't go stale
+
+_TRAILING_PUNCT = re.compile(r"[\s?!.,;:。？！，]+$")
+
+
+def normalise_query(text: str) -> str:
+    """Casefold, collapse whitespace and drop trailing punctuation"""
+    return _TRAILING_PUNCT.sub("", " ".join(text.casefold().split()))
+
+
+class EmbeddingCache:
+    """Query vectors keyed on (model, dimensions, normalised text).
+
+    Stored in the "embeddings" namespace of the shared cache backend, so
+    with CACHE_BACKEND=sqlite or postgres every worker shares one warm set
+    that survives restarts.
+    """
+
+    NAMESPACE = "embeddings"
+
+    def __init__(self, model: str = EMBEDDING_MODEL, dimensions: int = EMBEDDING_DIMENSIONS,
+                 backend: Optional[CacheBackend] = None, ttl: Optional[float] = EMBED_CACHE_TTL):
+        self.model = model
+        self.dimensions = dimensions
+        self._backend = backend
+        self.ttl = ttl
+
+    @property
+    def backend(self) -> CacheBackend:
+        return self._backend or shared_cache()
+
+    def key(self, text: str) -> str:
+        raw = f"{self.model}:{self.dimensions}:{normalise_query(text)}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        vec = self.backend.get_array(self.NAMESPACE, self.key(text))
+        if vec is not None and vec.shape[0] != self.dimensions:
+            return None
+        return vec
+
+    def put(self, text: str, vec: np.ndarray) -> None:
+        self.backend.set_array(self.NAMESPACE, self.key(text), vec, ttl=self.ttl)
+
+    def get_or_embed(self, text: str, embed_fn: Callable[[str], np.ndarray]) -> np.ndarray:
+        vec = self.get(text)
+        if vec is None:
+            vec = embed_fn(text)
+            self.put(text, vec)
+        return vec
+
+    def get_or_embed_many(self, texts: List[str], embed_many_fn: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """Rows for texts in order; only the misses go to embed_many_fn, in one call"""
+        found = [self.get(t) for t in texts]
+        missing = [i for i, vec in enumerate(found) if vec is None]
+        if missing:
+            fresh = embed_many_fn([texts[i] for i in missing])
+            for i, vec in zip(missing, fresh):
+                self.put(texts[i], vec)
+                found[i] = vec
+        return np.stack(found).astype(np.float32, copy=False)
+
+    def stats(self) -> Dict[str, object]:
+        return self.backend.stats().get(self.NAMESPACE, {})
@@ -6,6 +6,8 @@ import openai
 import tiktoken
 from dotenv import load_dotenv
 
+from knowledge_index import EMBEDDING_MODEL, embedding_request
+
 # ─── Load OpenAI API key ─────────────────────────────────────────────
 load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY")
@@ -13,7 +15,7 @@ if not openai.api_key:
     raise RuntimeError("OPENAI_API_KEY not set in .env")
 
 # ─── Embedding model and config ──────────────────────────────────────
-EMB_MODEL = "text-embedding-3-small"
+EMB_MODEL = EMBEDDING_MODEL
 KB_FOLDER = "kb_chunks"
 MAX_TOKENS = 8192
 tokenizer = tiktoken.encoding_for_model(EMB_MODEL)
@@ -31,9 +33,8 @@ def generate_embeddings(chunks):
             print(f"Skipping (too long: {token_count} tokens): {chunk['text'][:50]}...")
             continue
         try:
-            response = openai.embeddings.create(model=EMB_MODEL, input=[chunk["text"]])
-            embedding = response.data[0].embedding
-            chunk["embedding"] = embedding
+            response = openai.embeddings.create(**embedding_request([chunk["text"]]))
+            chunk["embedding"] = np.asarray(response.data[0].embedding, dtype=np.float32)
             enriched_chunks.append(chunk)
         except Exception as e:
             print(f"⚠️ Embedding error for chunk: {chunk['text'][:50]}... → {e}")
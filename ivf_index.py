@@ -0,0 +1,115 @@
+# ivf_index.py
+"""Inverted-file (IVF) approximate nearest-neighbour index in pure NumPy"""
+
+import os
+from typing import Optional
+
+import numpy as np
+
+KB_IVF_CENTROIDS_FILE = "kb_ivf_centroids.npy"
+KB_IVF_ORDER_FILE = "kb_ivf_order.npy"
+KB_IVF_OFFSETS_FILE = "kb_ivf_offsets.npy"
+
+ASSIGN_BLOCK_ROWS = 16384   # rows assigned to centroids per matmul
+TRAIN_POINTS_PER_LIST = 64  # k-means training sample size per centroid
+
+
+def _normalise(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-10)
+
+
+def assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the nearest (highest dot product) centroid for each row"""
+    labels = np.empty(vectors.shape[0], dtype=np.int32)
+    for start in range(0, vectors.shape[0], ASSIGN_BLOCK_ROWS):
+        block = np.asarray(vectors[start:start + ASSIGN_BLOCK_ROWS], dtype=np.float32)
+        labels[start:start + block.shape[0]] = np.argmax(block @ centroids.T, axis=1)
+    return labels
+
+
+def spherical_kmeans(vectors: np.ndarray, nlist: int, n_iter: int = 20, seed: int = 0) -> np.ndarray:
+    """Cluster unit vectors by cosine similarity; returns unit-norm centroids.
+
+    Trains on a random sample of TRAIN_POINTS_PER_LIST * nlist rows, which
+    is plenty for placing centroids and keeps build time bounded.
+    """
+    rng = np.random.default_rng(seed)
+    n = vectors.shape[0]
+    sample_size = min(n, TRAIN_POINTS_PER_LIST * nlist)
+    sample = np.asarray(vectors[np.sort(rng.choice(n, size=sample_size, replace=False))], dtype=np.float32)
+    centroids = sample[rng.choice(sample_size, size=nlist, replace=False)].copy()
+
+    for _ in range(n_iter):
+        labels = np.argmax(sample @ centroids.T, axis=1)
+        counts = np.bincount(labels, minlength=nlist)
+        # Sum each cluster's members with one reduceat over label-sorted rows
+        order = np.argsort(labels, kind="stable")
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        sums = np.zeros_like(centroids)
+        filled = counts > 0
+        sums[filled] = np.add.reduceat(sample[order], starts[filled], axis=0)
+        # Re-seed empty clusters from random sample points
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = sample[rng.choice(sample_size, size=int(empty.sum()), replace=False)]
+        centroids = _normalise(sums)
+    return centroids.astype(np.float32)
+
+
+class IVFIndex:
+    """Rows grouped into nlist k-means clusters ("inverted lists").
+
+    A query scores the centroids, then only the rows in the nprobe closest
+    lists. order holds row ids grouped by list; list c spans
+    order[offsets[c]:offsets[c + 1]].
+    """
+
+    def __init__(self, centroids: np.ndarray, order: np.ndarray, offsets: np.ndarray):
+        if offsets.shape[0] != centroids.shape[0] + 1:
+            raise ValueError(f"offsets has {offsets.shape[0]} entries for {centroids.shape[0]} lists")
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, nlist: Optional[int] = None, n_iter: int = 20, seed: int = 0) -> "IVFIndex":
+        n = vectors.shape[0]
+        nlist = nlist or max(1, int(4 * np.sqrt(n)))
+        nlist = min(nlist, n)
+        centroids = spherical_kmeans(vectors, nlist, n_iter=n_iter, seed=seed)
+        labels = assign(vectors, centroids)
+        order = np.argsort(labels, kind="stable").astype(np.int64)
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=nlist), out=offsets[1:])
+        return cls(centroids, order, offsets)
+
+    @property
+    def nlist(self) -> int:
+        return self.centroids.shape[0]
+
+    def candidates(self, q: np.ndarray, nprobe: int) -> np.ndarray:
+        """Sorted row ids from the nprobe lists nearest to unit query q"""
+        nprobe = min(max(1, nprobe), self.nlist)
+        centroid_scores = self.centroids @ q
+        probe = np.argpartition(centroid_scores, self.nlist - nprobe)[self.nlist - nprobe:]
+        rows = np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in probe])
+        return np.sort(rows)
+
+    # ── Persistence ─────────────────────────────────────────────────────
+    def save(self, folder: str, write_fn) -> None:
+        """Write the arrays with write_fn(path, array)"""
+        write_fn(os.path.join(folder, KB_IVF_CENTROIDS_FILE), self.centroids)
+        write_fn(os.path.join(folder, KB_IVF_ORDER_FILE), self.order)
+        write_fn(os.path.join(folder, KB_IVF_OFFSETS_FILE), self.offsets)
+
+    @classmethod
+    def load(cls, folder: str) -> Optional["IVFIndex"]:
+        path = os.path.join(folder, KB_IVF_CENTROIDS_FILE)
+        if not os.path.exists(path):
+            return None
+        return cls(
+            np.load(path),
+            np.load(os.path.join(folder, KB_IVF_ORDER_FILE), mmap_mode="r"),
+            np.load(os.path.join(folder, KB_IVF_OFFSETS_FILE)),
+        )
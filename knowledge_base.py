@@ -0,0 +1,182 @@
+# knowledge_base.py
+"""Loaded knowledge base bundle with versioning and atomic hot reload"""
+
+import os
+import hashlib
+import threading
+from datetime import datetime
+from typing import Callable, List, Optional
+
+from chunk_store import ChunkStore
+from knowledge_index import (
+    KnowledgeIndex, has_binary_kb, load_binary_kb, load_pickle_kb,
+    KB_META_FILE, EMBEDDING_DIMENSIONS,
+)
+from lexical_index import BM25Index
+from embedding_backends import LocalIndex, KB_LOCAL_META_FILE, load_local_index
+
+KB_PICKLE_FILE = "kb_chunks.pkl"
+
+
+def kb_version(folder: str) -> str:
+    """Short identifier that changes whenever the KB files on disk change.
+
+    Built from file names, sizes and mtimes, so it is cheap enough for an
+    mtime watcher to poll and stable across workers loading the same files.
+    Binary builds are covered by kb_meta.json alone: it is replaced only
+    once every file of the build it names is in place.
+    """
+    digest = hashlib.sha1()
+    for name in (KB_PICKLE_FILE, KB_META_FILE, KB_LOCAL_META_FILE):
+        path = os.path.join(folder, name)
+        if os.path.exists(path):
+            st = os.stat(path)
+            digest.update(f"{name}:{st.st_size}:{st.st_mtime_ns};".encode())
+    return digest.hexdigest()[:12]
+
+
+class KnowledgeBase:
+    """Everything retrieval needs from one KB build, swapped as a unit.
+
+    Request handlers take one reference to the current KnowledgeBase and
+    use it throughout, so indices from the vector/lexical search always
+    line up with the chunks they read, even if a reload lands mid-request.
+    """
+
+    def __init__(self, index: KnowledgeIndex, chunks: ChunkStore, lexical: BM25Index, version: str,
+                 local: Optional[LocalIndex] = None):
+        self.index = index
+        self.chunks = chunks
+        self.lexical = lexical
+        self.version = version
+        self.local = local  # offline fallback when the embeddings API fails
+        self.loaded_at = datetime.utcnow()
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def memory_bytes(self) -> int:
+        """Rough resident size of the arrays behind this KB (mapped files included)"""
+        index = self.index
+        arrays = [index.vectors, index.coarse, self.chunks.text, self.chunks.offsets, self.chunks.codes]
+        if index.ivf is not None:
+            arrays += [index.ivf.centroids, index.ivf.order]
+        if self.local is not None:
+            arrays.append(self.local.index.vectors)
+        total = sum(a.nbytes for a in arrays if a is not None)
+        total += sum(d.nbytes + w.nbytes for d, w in self.lexical.postings.values())
+        return total
+
+
+def _binary_kb_is_current(folder: str) -> bool:
+    if not has_binary_kb(folder):
+        return False
+    pickle_path = os.path.join(folder, KB_PICKLE_FILE)
+    if not os.path.exists(pickle_path):
+        return True
+    return os.path.getmtime(os.path.join(folder, KB_META_FILE)) >= os.path.getmtime(pickle_path)
+
+
+def load_knowledge_base(folder: str, quantisation: str = "none", model: Optional[str] = None,
+                        dimensions: Optional[int] = None) -> KnowledgeBase:
+    """Load the KB in folder, preferring the memory-mapped binary format.
+
+    Falls back to kb_chunks.pkl when the binary files are missing or older
+    than the pickle. With model set, a binary KB whose kb_meta.json records
+    a different embedding model is refused: its vectors would be compared
+    with query vectors from another space. The pickle records no model.
+    A KB whose width isn't dimensions (default EMBEDDING_DIMENSIONS), the
+    width of the query vectors, is refused too.
+    """
+    version = kb_version(folder)
+    if _binary_kb_is_current(folder):
+        index, chunks = load_binary_kb(folder, quantisation=quantisation)
+        print("🗺️  Knowledge base memory-mapped from binary format")
+    else:
+        index, chunks = load_pickle_kb(os.path.join(folder, KB_PICKLE_FILE), quantisation=quantisation)
+    dimensions = dimensions or EMBEDDING_DIMENSIONS
+    if index.dim != dimensions:
+        raise RuntimeError(
+            f"Knowledge base has {index.dim}-dim embeddings but queries are {dimensions}-dim; "
+            "rebuild it or run convert_kb_to_binary.py with the same EMBEDDING_BACKEND and dimensions"
+        )
+    if model is not None and index.model is not None and index.model != model:
+        raise RuntimeError(
+            f"Knowledge base in {folder} was embedded with {index.model} but queries use {model}; "
+            "rebuild it with the same EMBEDDING_MODEL / EMBEDDING_BACKEND"
+        )
+    print(f"📚 Knowledge index ready: {len(index)} chunks × {index.dim} dims "
+          f"(quantisation: {index.quantisation}, ivf lists: {index.ivf.nlist if index.ivf else 0})")
+
+    # BM25 over chunk texts for exact-fact lookups ("Year 7 fees", "Pont Street")
+    # and as a no-network fallback when the embeddings API is slow or down
+    lexical = BM25Index(chunk.get("text", "") for chunk in chunks)
+    print(f"🔤 Lexical index ready: {len(lexical.postings)} terms")
+
+    local = load_local_index(folder, expected_rows=len(chunks))
+    if local is not None:
+        print(f"🧮 Local fallback index ready: {len(local.index)} × {local.index.dim}")
+    return KnowledgeBase(index, chunks, lexical, version, local)
+
+
+class KnowledgeBaseHolder:
+    """Holds the live KnowledgeBase and replaces it without downtime.
+
+    reload() builds the new KB off to the side and then swaps a single
+    reference, which is atomic in CPython, so readers see either the old
+    KB or the new one and never a half-built index. A failed reload leaves
+    the current KB in place. Callables in listeners get the new KB after
+    each swap.
+    """
+
+    def __init__(self, folder: str, quantisation: str = "none", model: Optional[str] = None,
+                 dimensions: Optional[int] = None):
+        self.folder = folder
+        self.quantisation = quantisation
+        self.model = model
+        self.dimensions = dimensions
+        self._reload_lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.listeners: List[Callable[[KnowledgeBase], None]] = []
+        self.current = load_knowledge_base(folder, quantisation, model, dimensions)
+
+    @property
+    def version(self) -> str:
+        return self.current.version
+
+    def reload(self, force: bool = False) -> bool:
+        """Rebuild from disk if the files changed (or force); returns True if swapped"""
+        with self._reload_lock:
+            if not force and kb_version(self.folder) == self.current.version:
+                return False
+            new_kb = load_knowledge_base(self.folder, self.quantisation, self.model, self.dimensions)
+            old_version = self.current.version
+            self.current = new_kb
+            print(f"🔄 Knowledge base swapped: {old_version} → {new_kb.version}")
+        for listener in self.listeners:
+            try:
+                listener(new_kb)
+            except Exception as e:
+                print(f"⚠️ Knowledge base reload listener failed: {e}")
+        return True
+
+    def watch(self, interval: float) -> None:
+        """Poll the KB files every interval seconds and reload on change"""
+        if self._watcher is not None:
+            return
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.reload()
+                except Exception as e:
+                    print(f"⚠️ Knowledge base reload failed, keeping {self.current.version}: {e}")
+
+        self._watcher = threading.Thread(target=run, name="kb-watcher", daemon=True)
+        self._watcher.start()
+        print(f"👀 Watching {self.folder} for KB changes every {interval:.0f}s")
+
+    def stop(self) -> None:
+        """Stop the watcher thread, if any"""
+        self._stop.set()
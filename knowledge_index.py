@@ -0,0 +1,428 @@
+# knowledge_index.py
+"""Vector index over the knowledge base embeddings"""
+
+import os
+import json
+import time
+import uuid
+import shutil
+import pickle
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from chunk_store import ChunkStore
+from ivf_index import IVFIndex
+
+# ── Embedding model ─────────────────────────────────────────────────────
+# text-embedding-3 models accept a `dimensions` argument; smaller vectors
+# shrink the index and every search matmul. Build scripts and embed_text
+# must agree, so both read these settings from here.
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "1536"))
+
+
+def embedding_request(text) -> Dict[str, Any]:
+    """Keyword arguments for client.embeddings.create"""
+    return {"model": EMBEDDING_MODEL, "dimensions": EMBEDDING_DIMENSIONS, "input": text}
+
+
+def truncate_embeddings(vectors: np.ndarray, dim: int) -> np.ndarray:
+    """Shorten text-embedding-3 vectors to dim and renormalise.
+
+    These models are trained so a prefix of the vector is itself a usable
+    embedding, which is what the API's `dimensions` argument returns.
+    """
+    if dim > vectors.shape[-1]:
+        raise ValueError(f"Cannot truncate {vectors.shape[-1]}-dim embeddings to {dim}")
+    return normalise_rows(vectors[..., :dim])
+
+
+# ── On-disk binary format ───────────────────────────────────────────────
+# kb_vectors.npy holds the unit-normalised float32 matrix and is opened with
+# mmap_mode='r', so every gunicorn worker shares one page-cache copy.
+# Chunk metadata is a ChunkStore (kb_text/kb_offsets/kb_codes.npy, also
+# memory-mapped) and kb_meta.json holds its interned string tables.
+#
+# Each build writes its .npy files into a fresh builds/<build id>/ directory
+# and then replaces kb_meta.json, which names that build. kb_meta.json is the
+# only file that changes in place, so a reader that opens it gets a set of
+# companion files from a single build however a rebuild interleaves.
+KB_VECTORS_FILE = "kb_vectors.npy"
+KB_META_FILE = "kb_meta.json"
+KB_BUILDS_DIR = "builds"
+KB_KEEP_BUILDS = 2  # the live build and the one before, for workers still on it
+
+# ── Quantisation ────────────────────────────────────────────────────────
+# "int8" quarters the matrix scanned per query; the top candidates are then
+# rescored against the float32 vectors, which in the binary format stay on
+# disk and are only paged in for those few rows. That is the only gain: the
+# scan itself runs at float32 speed at best, so quantising a KB already held
+# in memory (the pickle path) just adds a copy. float16 is not offered since
+# NumPy converts it to float32 several times slower than BLAS scores it.
+QUANTISATION_MODES = ("none", "int8")
+KB_QUANTISED_FILES = {
+    "int8": "kb_vectors_int8.npy",
+}
+KB_INT8_SCALES_FILE = "kb_scales_int8.npy"
+RESCORE_FACTOR = 4          # coarse candidates kept per requested result
+COARSE_BLOCK_ROWS = 256     # rows upcast at a time; the float32 block stays in cache
+
+# ── Approximate search (IVF) ────────────────────────────────────────────
+# Brute force is exact and fast enough for one school's site; an IVF index
+# is only built once the KB reaches IVF_MIN_ROWS chunks.
+IVF_MIN_ROWS = int(os.getenv("KB_IVF_MIN_ROWS", "50000"))
+IVF_NPROBE = int(os.getenv("KB_IVF_NPROBE", "8"))
+
+# ── Diversity (MMR) ─────────────────────────────────────────────────────
+MMR_LAMBDA = float(os.getenv("KB_MMR_LAMBDA", "0.7"))  # 1.0 = pure relevance
+MMR_DUPLICATE = 0.95  # candidates this close to a chosen passage are dropped
+MMR_POOL_FACTOR = 3   # candidates retrieved per passage kept
+
+# Chunk fields retrieval actually reads; embeddings live only in the matrix
+CHUNK_FIELDS = ("text", "source", "url", "label")
+
+
+# ── Top-k selection ─────────────────────────────────────────────────────
+def top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (scores, indices) of the k highest scores, best first.
+
+    Uses argpartition so only the k winners are sorted rather than the
+    whole array.
+    """
+    n = scores.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+    if k < n:
+        part = np.argpartition(scores, n - k)[n - k:]
+    else:
+        part = np.arange(n)
+    order = part[np.argsort(scores[part])[::-1]]
+    return scores[order], order
+
+
+def normalise_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-10)
+
+
+def quantise(vectors: np.ndarray, mode: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Return (coarse_matrix, per-dimension scales or None) for mode"""
+    if mode == "int8":
+        scales = np.abs(vectors).max(axis=0).astype(np.float32) / 127.0
+        scales = np.maximum(scales, 1e-10)
+        coarse = np.clip(np.rint(vectors / scales), -127, 127).astype(np.int8)
+        return coarse, scales
+    raise ValueError(f"Unknown quantisation mode {mode!r}; expected one of {QUANTISATION_MODES}")
+
+
+# ── Knowledge index ─────────────────────────────────────────────────────
+class KnowledgeIndex:
+    """Cosine-similarity index over unit-normalised float32 embeddings.
+
+    Rows are normalised once when the index is built, so a query costs a
+    single matrix-vector product plus a top-k selection. With quantisation
+    set, the product runs over an int8 copy and only the best
+    k * rescore_factor candidates are rescored in full precision. With an
+    IVF index attached, only rows in the nprobe nearest clusters are scored.
+    model names the embedding model when the KB recorded it.
+    """
+
+    def __init__(self, embeddings: np.ndarray, normalised: bool = False,
+                 quantisation: str = "none", rescore_factor: int = RESCORE_FACTOR,
+                 coarse: Optional[Tuple[np.ndarray, Optional[np.ndarray]]] = None,
+                 ivf: Optional[IVFIndex] = None, nprobe: int = IVF_NPROBE, model: Optional[str] = None):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2:
+            raise ValueError(f"Expected a 2-D embedding matrix, got shape {vectors.shape}")
+        if quantisation not in QUANTISATION_MODES:
+            raise ValueError(f"Unknown quantisation mode {quantisation!r}; expected one of {QUANTISATION_MODES}")
+        # Already-normalised input (e.g. a memory-mapped kb_vectors.npy) is
+        # used as-is so the pages stay shared rather than copied per worker
+        self.vectors = vectors if normalised else normalise_rows(vectors)
+        self.quantisation = quantisation
+        self.rescore_factor = max(1, rescore_factor)
+        self.coarse: Optional[np.ndarray] = None
+        self.scales: Optional[np.ndarray] = None
+        if quantisation != "none":
+            self.coarse, self.scales = coarse if coarse is not None else quantise(self.vectors, quantisation)
+        self.ivf = ivf
+        self.nprobe = nprobe
+        self.model = model
+
+    def build_ivf(self, nlist: Optional[int] = None) -> IVFIndex:
+        self.ivf = IVFIndex.build(self.vectors, nlist=nlist)
+        return self.ivf
+
+    def __len__(self) -> int:
+        return self.vectors.shape[0]
+
+    @property
+    def dim(self) -> int:
+        return self.vectors.shape[1]
+
+    def _coarse_scores(self, q: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        # NumPy has no mixed-precision matmul, so upcast into one small
+        # reused buffer rather than a fresh float32 copy per block
+        qs = q * self.scales if self.scales is not None else q
+        n = len(self) if rows is None else rows.shape[0]
+        scores = np.empty(n, dtype=np.float32)
+        buffer = np.empty((min(n, COARSE_BLOCK_ROWS), self.dim), dtype=np.float32)
+        for start in range(0, n, COARSE_BLOCK_ROWS):
+            if rows is None:
+                block = self.coarse[start:start + COARSE_BLOCK_ROWS]
+            else:
+                block = self.coarse[rows[start:start + COARSE_BLOCK_ROWS]]
+            upcast = buffer[:block.shape[0]]
+            np.copyto(upcast, block, casting="unsafe")
+            np.dot(upcast, qs, out=scores[start:start + block.shape[0]])
+        return scores
+
+    def _rank(self, q: np.ndarray, k: int, rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top k among rows (all rows if None); rows must be sorted"""
+        if self.coarse is None:
+            if rows is None:
+                return top_k(self.vectors @ q, k)
+            scores, order = top_k(self.vectors[rows] @ q, k)
+            return scores, rows[order]
+        _, candidates = top_k(self._coarse_scores(q, rows), k * self.rescore_factor)
+        if rows is not None:
+            candidates = rows[candidates]
+        # Sorted row order keeps reads from a memory-mapped matrix sequential
+        candidates = np.sort(candidates)
+        scores, order = top_k(self.vectors[candidates] @ q, k)
+        return scores, candidates[order]
+
+    def score_rows(self, q_vec: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """Cosine similarity of q_vec with the given rows, in the order given"""
+        return np.asarray(self.vectors[rows] @ normalise_rows(q_vec), dtype=np.float32)
+
+    def search(self, q_vec: np.ndarray, k: int = 10, nprobe: Optional[int] = None,
+               exact: bool = False, rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (scores, indices) of the k nearest chunks, best first.
+
+        Uses the IVF index when one is attached unless exact=True; nprobe
+        overrides the number of clusters probed for this query. rows (sorted
+        row ids, e.g. from ChunkStore.filter_rows) restricts the search to
+        those chunks.
+        """
+        if q_vec.shape[-1] != self.dim:
+            raise ValueError(f"Query has {q_vec.shape[-1]} dims but the index was built with {self.dim}")
+        q = normalise_rows(q_vec)
+        if self.ivf is None or exact:
+            return self._rank(q, k, rows)
+        candidates = self.ivf.candidates(q, nprobe or self.nprobe)
+        if rows is not None:
+            candidates = np.intersect1d(candidates, rows, assume_unique=True)
+        return self._rank(q, k, candidates)
+
+
+    def search_many(self, q_vecs: np.ndarray, k: int = 10, nprobe: Optional[int] = None,
+                    exact: bool = False) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """search() for a batch of queries, one (scores, indices) pair per row.
+
+        On the brute-force float32 path all queries are scored with a single
+        matrix-matrix product; IVF and quantised indexes search per query.
+        """
+        q_vecs = np.atleast_2d(np.asarray(q_vecs, dtype=np.float32))
+        if q_vecs.shape[1] != self.dim:
+            raise ValueError(f"Queries have {q_vecs.shape[1]} dims but the index was built with {self.dim}")
+        if self.coarse is not None or (self.ivf is not None and not exact):
+            return [self.search(q, k, nprobe=nprobe, exact=exact) for q in q_vecs]
+        scores = self.vectors @ normalise_rows(q_vecs).T
+        return [top_k(np.ascontiguousarray(scores[:, j]), k) for j in range(q_vecs.shape[0])]
+
+    def mmr(self, q_vec: np.ndarray, candidates: np.ndarray, k: int = 10, lam: float = MMR_LAMBDA,
+            duplicate: float = MMR_DUPLICATE,
+            relevance: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Pick k of candidates by maximal marginal relevance; returns (scores, indices).
+
+        Each step takes the candidate maximising lam * relevance minus
+        (1 - lam) * its highest similarity to those already taken, using one
+        small candidate Gram matrix. Candidates at or above duplicate
+        similarity to a taken passage are dropped, so fewer than k may come
+        back. relevance defaults to cosine similarity with q_vec; pass one
+        value per candidate (best 1.0) to rank by something else, such as a
+        fused hybrid ranking. scores are cosine similarity either way, in
+        selection order.
+        """
+        candidates = np.asarray(candidates)
+        if len(candidates) == 0:
+            return np.empty(0, dtype=np.float32), candidates
+        vecs = np.asarray(self.vectors[candidates], dtype=np.float32)
+        cosine = vecs @ normalise_rows(q_vec)
+        relevance = cosine if relevance is None else np.asarray(relevance, dtype=np.float32)
+        gram = vecs @ vecs.T
+
+        redundancy = np.zeros(len(candidates), dtype=np.float32)
+        available = np.ones(len(candidates), dtype=bool)
+        chosen = []
+        while len(chosen) < k and available.any():
+            mmr = np.where(available, lam * relevance - (1 - lam) * redundancy, -np.inf)
+            j = int(np.argmax(mmr))
+            chosen.append(j)
+            available[j] = False
+            available &= gram[j] < duplicate
+            np.maximum(redundancy, gram[j], out=redundancy)
+        chosen = np.array(chosen, dtype=np.int64)
+        return cosine[chosen].astype(np.float32), candidates[chosen]
+
+
+# ── Chunk splitting ─────────────────────────────────────────────────────
+def compact_chunk(chunk: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: chunk[k] for k in CHUNK_FIELDS if k in chunk}
+
+
+def split_chunks(chunks: List[Dict[str, Any]]) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+    """Split pickled chunks into a float32 matrix and embedding-free metadata.
+
+    The matrix is filled row by row so the per-chunk lists of Python floats
+    can be dropped along with the original chunk dicts.
+    """
+    dim = len(chunks[0]["embedding"]) if chunks else 0
+    vectors = np.empty((len(chunks), dim), dtype=np.float32)
+    meta = []
+    for i, chunk in enumerate(chunks):
+        vectors[i] = chunk["embedding"]
+        meta.append(compact_chunk(chunk))
+    return vectors, meta
+
+
+def load_pickle_kb(path: str, quantisation: str = "none",
+                   dim: int = EMBEDDING_DIMENSIONS) -> Tuple[KnowledgeIndex, ChunkStore]:
+    """Load kb_chunks.pkl keeping only the matrix and columnar metadata.
+
+    Embeddings longer than dim are truncated and renormalised. The float32
+    matrix is resident here, so quantisation is ignored.
+    """
+    if quantisation != "none":
+        print(f"⚠️ KB quantisation '{quantisation}' only applies to the memory-mapped binary KB; "
+              "searching the pickled KB in float32 (run convert_kb_to_binary.py)")
+        quantisation = "none"
+    with open(path, "rb") as f:
+        chunks = pickle.load(f)
+    vectors, meta = split_chunks(chunks)
+    del chunks
+    vectors = truncate_embeddings(vectors, dim)
+    index = KnowledgeIndex(vectors, normalised=True, quantisation=quantisation)
+    if len(index) >= IVF_MIN_ROWS:
+        # Binary KBs carry a prebuilt IVF; from a pickle it is built per load
+        index.build_ivf()
+    return index, ChunkStore.from_chunks(meta)
+
+
+# ── Binary KB save / load ───────────────────────────────────────────────
+def _atomic_write(path: str, write_fn) -> None:
+    # Write next to the target then rename, so a worker that already has the
+    # old file mapped keeps reading the old inode rather than a torn file
+    tmp = f"{path}.tmp"
+    write_fn(tmp)
+    os.replace(tmp, path)
+
+
+def _save_npy(path: str, array: np.ndarray) -> None:
+    def write(tmp):
+        with open(tmp, "wb") as f:
+            np.save(f, array)
+    _atomic_write(path, write)
+
+
+def new_build_id() -> str:
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+
+def kb_build_folder(folder: str, meta: Dict[str, Any]) -> str:
+    """Directory holding the companion files of the build meta describes.
+
+    KBs written before builds had their own directory keep them in folder.
+    """
+    build = meta.get("build")
+    return os.path.join(folder, KB_BUILDS_DIR, build) if build else folder
+
+
+def read_kb_meta(folder: str) -> Optional[Dict[str, Any]]:
+    path = os.path.join(folder, KB_META_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _prune_builds(folder: str, keep: int = KB_KEEP_BUILDS) -> None:
+    # Workers that still have an old build mapped keep reading its inodes
+    # after the directory is removed; only new loads need the files
+    builds_dir = os.path.join(folder, KB_BUILDS_DIR)
+    builds = sorted((entry for entry in os.scandir(builds_dir) if entry.is_dir()),
+                    key=lambda entry: entry.stat().st_mtime, reverse=True)
+    for entry in builds[keep:]:
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def save_binary_kb(chunks: List[Dict[str, Any]], folder: str,
+                   dim: int = EMBEDDING_DIMENSIONS, model: str = EMBEDDING_MODEL) -> str:
+    """Write chunks as a new build (kb_vectors.npy and the ChunkStore arrays)
+    and point kb_meta.json at it. Returns the build id.
+
+    Embeddings longer than dim are truncated and renormalised.
+    """
+    vectors, meta = split_chunks(chunks)
+    vectors = truncate_embeddings(vectors, dim)
+    store = ChunkStore.from_chunks(meta)
+    build = new_build_id()
+    build_folder = os.path.join(folder, KB_BUILDS_DIR, build)
+    os.makedirs(build_folder)
+
+    _save_npy(os.path.join(build_folder, KB_VECTORS_FILE), vectors)
+    for mode, filename in KB_QUANTISED_FILES.items():
+        coarse, scales = quantise(vectors, mode)
+        _save_npy(os.path.join(build_folder, filename), coarse)
+        if scales is not None:
+            _save_npy(os.path.join(build_folder, KB_INT8_SCALES_FILE), scales)
+    if vectors.shape[0] >= IVF_MIN_ROWS:
+        IVFIndex.build(vectors).save(build_folder, _save_npy)
+    tables = store.save(build_folder, _save_npy)
+
+    def write_meta(path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"build": build, "count": len(store), "dim": int(vectors.shape[1]), "model": model,
+                       "tables": tables}, f, ensure_ascii=False)
+
+    # kb_meta.json goes last: replacing it is what publishes the build
+    _atomic_write(os.path.join(folder, KB_META_FILE), write_meta)
+    _prune_builds(folder)
+    return build
+
+
+def has_binary_kb(folder: str) -> bool:
+    meta = read_kb_meta(folder)
+    return meta is not None and os.path.exists(os.path.join(kb_build_folder(folder, meta), KB_VECTORS_FILE))
+
+
+def _load_quantised(folder: str, mode: str) -> Optional[Tuple[np.ndarray, Optional[np.ndarray]]]:
+    path = os.path.join(folder, KB_QUANTISED_FILES[mode])
+    if not os.path.exists(path):
+        return None
+    coarse = np.load(path, mmap_mode="r")
+    scales = np.load(os.path.join(folder, KB_INT8_SCALES_FILE)) if mode == "int8" else None
+    return coarse, scales
+
+
+def load_binary_kb(folder: str, quantisation: str = "none") -> Tuple[KnowledgeIndex, ChunkStore]:
+    """Read kb_meta.json and open its build's vectors and chunk columns memory-mapped"""
+    with open(os.path.join(folder, KB_META_FILE), "r", encoding="utf-8") as f:
+        payload = json.load(f)
+    folder = kb_build_folder(folder, payload)
+    vectors = np.load(os.path.join(folder, KB_VECTORS_FILE), mmap_mode="r")
+    if payload.get("dim", vectors.shape[1]) != vectors.shape[1]:
+        raise ValueError(f"{KB_META_FILE} records dim {payload['dim']} but {KB_VECTORS_FILE} has {vectors.shape[1]}")
+    store = ChunkStore.load(folder, payload["tables"])
+    if len(store) != vectors.shape[0]:
+        raise ValueError(f"Chunk store has {len(store)} chunks but {KB_VECTORS_FILE} has {vectors.shape[0]} rows")
+    # Older binary KBs without the quantised files get them computed in memory
+    coarse = _load_quantised(folder, quantisation) if quantisation in KB_QUANTISED_FILES else None
+    ivf = IVFIndex.load(folder) if vectors.shape[0] >= IVF_MIN_ROWS else None
+    index = KnowledgeIndex(vectors, normalised=True, quantisation=quantisation, coarse=coarse, ivf=ivf,
+                           model=payload.get("model"))
+    return index, store
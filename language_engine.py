@@ -1,19 +1,32 @@
 # language_engine.py
 import os
+import hashlib
 import requests
 from dotenv import load_dotenv
 
+from cache_backend import shared_cache
+
 load_dotenv()
 DEEPL_API_KEY = os.getenv("DEEPL_API_KEY")
 
+DEEPL_API_URL = os.getenv("DEEPL_API_URL", "https://api-free.deepl.com/v2")
+_session = requests.Session()  # reuses the TLS connection to DeepL
+
 # Supported DeepL language codes
 SUPPORTED_LANGUAGES = {"fr", "de", "es", "zh"}
 
+TRANSLATION_CACHE_TTL = float(os.getenv("TRANSLATION_CACHE_TTL", str(30 * 24 * 3600)))
+
 def translate(text, target_lang):
     if target_lang not in SUPPORTED_LANGUAGES:
         return text  # No translation needed
 
-    url = "https://api-free.deepl.com/v2/translate"
+    cache_key = hashlib.sha1(f"{target_lang}:{text}".encode("utf-8")).hexdigest()
+    cached = shared_cache().get_json("translations", cache_key)
+    if cached is not None:
+        return cached
+
+    url = f"{DEEPL_API_URL}/translate"
     headers = {"Content-Type": "application/x-www-form-urlencoded"}
     data = {
         "auth_key": DEEPL_API_KEY,
@@ -22,9 +35,19 @@ def translate(text, target_lang):
     }
 
     try:
-        response = requests.post(url, data=data, headers=headers)
+        response = _session.post(url, data=data, headers=headers)
         result = response.json()
-        return result["translations"][0]["text"]
+        translated = result["translations"][0]["text"]
+        shared_cache().set_json("translations", cache_key, translated, ttl=TRANSLATION_CACHE_TTL)
+        return translated
     except Exception as e:
         print(f"Translation error: {e}")
         return text  # Fallback to original
+
+def warm_up(timeout=10):
+    """Open the pooled connection to DeepL with a usage query (no characters billed)"""
+    if not DEEPL_API_KEY:
+        return
+    response = _session.get(f"{DEEPL_API_URL}/usage", timeout=timeout,
+                            headers={"Authorization": f"DeepL-Auth-Key {DEEPL_API_KEY}"})
+    response.raise_for_status()
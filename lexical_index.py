@@ -0,0 +1,98 @@
+# lexical_index.py
+"""BM25 inverted index over chunk texts, plus reciprocal-rank fusion"""
+
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from knowledge_index import top_k
+
+# Words and numbers in any script ("élèves", "größe"), or single CJK
+# characters (zh isn't space-delimited, so those are never joined into words)
+TOKEN_RE = re.compile(r"[^\W_\u4e00-\u9fff]+|[\u4e00-\u9fff]")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for",
+    "from", "how", "i", "in", "is", "it", "me", "my", "of", "on", "or", "our",
+    "the", "their", "there", "this", "to", "was", "we", "what", "when", "where",
+    "which", "who", "will", "with", "you", "your",
+}
+
+RRF_K = 60  # standard damping constant from the RRF paper
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed set of documents.
+
+    Each posting stores its precomputed BM25 weight, so scoring a query is
+    just adding the posting arrays of its terms into one score vector.
+    """
+
+    def __init__(self, texts: Iterable[str], k1: float = 1.5, b: float = 0.75):
+        postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        lengths = []
+        for doc, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings[term].append((doc, tf))
+
+        self.n_docs = len(lengths)
+        doc_len = np.asarray(lengths, dtype=np.float32)
+        avg_len = float(doc_len.mean()) if self.n_docs else 0.0
+        norm = k1 * (1 - b + b * doc_len / max(avg_len, 1e-10))
+
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for term, entries in postings.items():
+            docs = np.fromiter((d for d, _ in entries), dtype=np.int32, count=len(entries))
+            tf = np.fromiter((t for _, t in entries), dtype=np.float32, count=len(entries))
+            idf = np.log(1 + (self.n_docs - len(entries) + 0.5) / (len(entries) + 0.5))
+            self.postings[term] = (docs, (idf * tf * (k1 + 1) / (tf + norm[docs])).astype(np.float32))
+
+    def __len__(self) -> int:
+        return self.n_docs
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is not None:
+                docs, weights = posting
+                scores[docs] += weights
+        return scores
+
+    def search(self, query: str, k: int = 10, rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (bm25_scores, indices) of the k best matching chunks; zero-score chunks are dropped.
+
+        rows (sorted row ids) restricts the results to those chunks.
+        """
+        scores = self.scores(query)
+        if rows is None:
+            scores, idxs = top_k(scores, k)
+        else:
+            scores, order = top_k(scores[rows], k)
+            idxs = rows[order]
+        keep = scores > 0
+        return scores[keep], idxs[keep]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[np.ndarray], k: int = RRF_K) -> np.ndarray:
+    """Fuse several best-first index lists; returns indices ordered by RRF score"""
+    return reciprocal_rank_scores(rankings, k)[0]
+
+
+def reciprocal_rank_scores(rankings: Sequence[np.ndarray], k: int = RRF_K) -> Tuple[np.ndarray, np.ndarray]:
+    """(indices, RRF scores) of the fused ranking, best first"""
+    fused: Dict[int, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, idx in enumerate(ranking):
+            fused[int(idx)] += 1.0 / (k + rank + 1)
+    order = sorted(fused, key=fused.get, reverse=True)
+    return (np.array(order, dtype=np.int64),
+            np.fromiter((fused[i] for i in order), dtype=np.float32, count=len(order)))
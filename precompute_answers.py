@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""
+Generate the precomputed answers for every AI-only topic and language
+(kb_precomputed_answers.json in each school's KB folder).
+
+Run after rebuilding a KB, or let the app do it in the background with
+PRECOMPUTE_ANSWERS=1. Answers are skipped when already current for the
+live KB version; pass --force to regenerate anyway.
+
+Usage: python precompute_answers.py [school ...] [--force]
+"""
+import sys
+import os
+
+from app import SCHOOLS, refresh_precomputed_answers
+from precomputed_answers import PRECOMPUTED_FILE
+
+force = "--force" in sys.argv
+keys = [arg for arg in sys.argv[1:] if arg != "--force"] or [SCHOOLS.default]
+
+for key in keys:
+    school = SCHOOLS.get(key)
+    if force and os.path.exists(school.precomputed.path):
+        os.remove(school.precomputed.path)
+    count = refresh_precomputed_answers(school)
+    print(f"✅ {school.name}: {count} answers written to {school.config.kb_folder}/{PRECOMPUTED_FILE}")
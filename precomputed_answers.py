@@ -0,0 +1,97 @@
+# precomputed_answers.py
+"""Answers generated ahead of time for fixed topics, stored next to the KB they came from"""
+
+import os
+import json
+import time
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from knowledge_index import _atomic_write
+
+PRECOMPUTED_FILE = "kb_precomputed_answers.json"
+PRECOMPUTE_LANGUAGES = tuple(os.getenv("PRECOMPUTE_LANGUAGES", "en,fr,de,es,zh").split(","))
+STALE_LOCK_SECONDS = 3600  # a build lock older than this is from a crashed worker
+
+
+class PrecomputedAnswers:
+    """kb_precomputed_answers.json in a KB folder: answers per language and topic.
+
+    The file records the KB version it was generated from, and get() only
+    serves it while that is still the live version. Every worker reads the
+    same file and picks up a rebuild by another worker through its mtime.
+    """
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.path = os.path.join(folder, PRECOMPUTED_FILE)
+        self._payload: Dict[str, Any] = {}
+        self._mtime: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _current(self) -> Dict[str, Any]:
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return {}
+        with self._lock:
+            if mtime != self._mtime:
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        self._payload = json.load(f)
+                    self._mtime = mtime
+                except (OSError, ValueError) as e:
+                    print(f"⚠️ Could not read {self.path}: {e}")
+                    return {}
+            return self._payload
+
+    def is_current(self, version: str) -> bool:
+        return self._current().get("kb_version") == version
+
+    def get(self, version: str, language: str, topic: str) -> Optional[Dict[str, Any]]:
+        payload = self._current()
+        if payload.get("kb_version") != version:
+            return None
+        return payload.get("answers", {}).get(language, {}).get(topic)
+
+    def build(self, version: str, topics: Iterable[str], generate: Callable[[str, str], Optional[Dict[str, Any]]],
+              languages: Iterable[str] = PRECOMPUTE_LANGUAGES) -> int:
+        """Generate every (language, topic) answer for version and write the file.
+
+        generate(topic, language) returns {"answer", "url", "label"} or None
+        to skip. Only one process builds at a time (lock file next to the
+        output); others return 0 straight away. Returns answers written.
+        """
+        lock_path = f"{self.path}.lock"
+        try:
+            if os.path.exists(lock_path) and time.time() - os.path.getmtime(lock_path) > STALE_LOCK_SECONDS:
+                os.remove(lock_path)
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            print(f"⏳ Precomputed answers for {self.folder} are being built by another worker")
+            return 0
+        os.close(fd)
+        try:
+            answers: Dict[str, Dict[str, Any]] = {}
+            count = 0
+            for language in languages:
+                for topic in topics:
+                    try:
+                        entry = generate(topic, language)
+                    except Exception as e:
+                        print(f"⚠️ Precompute failed for '{topic}' ({language}): {e}")
+                        continue
+                    if entry:
+                        answers.setdefault(language, {})[topic] = entry
+                        count += 1
+
+            def write(path):
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump({"kb_version": version, "generated_at": time.time(), "answers": answers},
+                              f, ensure_ascii=False)
+
+            _atomic_write(self.path, write)
+            print(f"📦 Precomputed {count} answers for KB {version} in {self.folder}")
+            return count
+        finally:
+            os.remove(lock_path)
@@ -1,11 +1,13 @@
-import os
 import pickle
-import numpy as np
 from dotenv import load_dotenv
-from openai import OpenAI
+
+from knowledge_index import save_binary_kb
+from embedding_backends import build_local_index, get_backend
+from static_qa_config import STATIC_QA_LIST
+from static_qa_vectors import build_static_qa_vectors
 
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+backend = get_backend()  # EMBEDDING_BACKEND=local builds without network
 
 # Load original metadata
 with open("metadata.pkl", "rb") as f:
@@ -20,12 +22,8 @@ for i, chunk in enumerate(metadata):
     if not text:
         continue
     try:
-        response = client.embeddings.create(
-            model="text-embedding-3-small",
-            input=text.strip()
-        )
-        embedding = response.data[0].embedding
-        chunk["embedding"] = embedding
+        # float32 halves the pickle versus a list of Python floats
+        chunk["embedding"] = backend.embed_one(text)
         kb_chunks.append(chunk)
         if i % 100 == 0:
             print(f"  🔹 Embedded chunk {i}/{len(metadata)}")
@@ -37,3 +35,15 @@ with open("kb_chunks/kb_chunks.pkl", "wb") as f:
     pickle.dump(kb_chunks, f)
 
 print(f"✅ Rebuilt kb_chunks.pkl with embeddings: {len(kb_chunks)} chunks saved.")
+
+# Memory-mapped binary KB (float32 plus an int8 quantised copy)
+save_binary_kb(kb_chunks, "kb_chunks", dim=backend.dimensions, model=backend.model)
+print("✅ Wrote binary KB files to kb_chunks/")
+
+# Offline fallback index for embeddings outages
+build_local_index("kb_chunks", [chunk.get("text") or chunk.get("chunk") for chunk in kb_chunks])
+print("✅ Wrote local fallback index to kb_chunks/")
+
+# Static Q&A variants, for matching paraphrases before RAG
+build_static_qa_vectors("kb_chunks", STATIC_QA_LIST, backend)
+print("✅ Wrote static Q&A vectors to kb_chunks/")
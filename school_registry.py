@@ -0,0 +1,222 @@
+# school_registry.py
+"""Per-school (tenant) knowledge bases, static Q&A and prompts, loaded lazily"""
+
+import os
+import json
+import importlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from knowledge_base import KnowledgeBase, KnowledgeBaseHolder
+from precomputed_answers import PrecomputedAnswers
+from static_qa_index import FuzzyMatcher, StaticQAIndex
+from static_qa_vectors import StaticQAVectors, load_static_qa_vectors
+
+DEFAULT_SCHOOL = "morehouse"
+
+MOREHOUSE_REALTIME_PROFILE = (
+    "You are Emily, a warm and knowledgeable admissions advisor for More House School, "
+    "an independent all-girls school in Knightsbridge, London. "
+    "Speak with a friendly British accent, using natural conversational tone. "
+    "Keep responses concise but complete - aim for 2-3 sentences per turn. "
+    "\n\n"
+    "=== KEY SCHOOL FACTS (memorise these) ===\n"
+    "School Fees 2025-2026:\n"
+    "  • Years 5 and 6: £7,800 per term (inc VAT)\n"
+    "  • Years 7-13: £10,950 per term (inc VAT)\n"
+    "Location: 22-24 Pont Street, Chelsea, London SW1X 0AA\n"
+    "Type: Independent all-girls school\n"
+    "Age range: Years 5-13 (ages 9-18)\n"
+    "Contact: 020 7235 2855 | registrar@morehousemail.org.uk\n"
+    "For ALL other detailed questions, use the kb_search tool.\n"
+    "=================================\n\n"
+)
+
+# Used when SCHOOLS_CONFIG is not set: the single school this app started as
+DEFAULT_SCHOOLS = {
+    DEFAULT_SCHOOL: {
+        "name": "More House School",
+        "kb_folder": "kb_chunks",
+        "static_qa_module": "static_qa_config",
+        "booking_school_id": 2,
+        "admissions_email": os.getenv("ADMISSIONS_EMAIL", "office@morehousemail.org.uk"),
+        "prompts": {"realtime_profile": MOREHOUSE_REALTIME_PROFILE},
+    }
+}
+
+# {school_name} is replaced with the school's name
+DEFAULT_PROMPTS = {
+    "rag_system": "You are a warm, helpful British school assistant. Be conversational.",
+    "voice_kb_system": "You are a helpful British school assistant. Be concise and conversational. Use British English.",
+    "realtime_profile": (
+        "You are Emily, a warm and knowledgeable admissions advisor for {school_name}. "
+        "Speak with a friendly British accent, using natural conversational tone. "
+        "Keep responses concise but complete - aim for 2-3 sentences per turn. "
+        "For ALL detailed questions about the school, use the kb_search tool.\n\n"
+    ),
+    "kb_search_tool": (
+        "REQUIRED: Search {school_name}'s knowledge base for factual information. MUST be called for any "
+        "question about: fees, costs, tuition, admissions, curriculum, facilities, staff, timings, support "
+        "services, or any other factual school information. Returns accurate, verified information from "
+        "school documentation."
+    ),
+    "enquiry_tool": (
+        "Send a tour booking or general enquiry email to {school_name} admissions. Use when parent wants "
+        "to book a tour, visit, or contact the school with general questions."
+    ),
+}
+
+
+class SchoolConfig:
+    def __init__(self, key: str, name: str, kb_folder: str, static_qa_module: str = "static_qa_config",
+                 booking_school_id: Optional[int] = None, prompts: Optional[Dict[str, str]] = None,
+                 prompts_file: Optional[str] = None, admissions_email: Optional[str] = None):
+        self.key = key
+        self.name = name
+        self.kb_folder = kb_folder
+        self.static_qa_module = static_qa_module
+        self.booking_school_id = booking_school_id
+        self.prompts = prompts or {}
+        self.prompts_file = prompts_file
+        self.admissions_email = admissions_email  # enquiries and meeting requests; none disables them
+
+
+class School:
+    """A loaded tenant: its KB holder, static Q&A list and indexes, prompts and precomputed answers"""
+
+    def __init__(self, config: SchoolConfig, kb_holder: KnowledgeBaseHolder,
+                 static_qas: List[Dict[str, Any]], prompts: Dict[str, str],
+                 static_vectors: Optional[StaticQAVectors] = None):
+        self.config = config
+        self.kb_holder = kb_holder
+        self.static_qas = static_qas
+        self.static_index = StaticQAIndex(static_qas, name=f"{config.key} static Q&A")
+        self.fuzzy = FuzzyMatcher(static_qas)
+        self.static_vectors = static_vectors
+        self.prompts = prompts
+        self.precomputed = PrecomputedAnswers(config.kb_folder)
+
+    @property
+    def key(self) -> str:
+        return self.config.key
+
+    @property
+    def name(self) -> str:
+        return self.config.name
+
+    @property
+    def booking_school_id(self) -> Optional[int]:
+        return self.config.booking_school_id
+
+    @property
+    def admissions_email(self) -> Optional[str]:
+        return self.config.admissions_email
+
+    @property
+    def kb(self) -> KnowledgeBase:
+        return self.kb_holder.current
+
+    def prompt(self, name: str) -> str:
+        return (self.prompts.get(name) or DEFAULT_PROMPTS[name]).replace("{school_name}", self.name)
+
+    def memory_bytes(self) -> int:
+        return self.kb.memory_bytes()
+
+
+def load_school_configs(path: Optional[str] = None) -> Dict[str, SchoolConfig]:
+    """Read schools from a JSON object keyed by tenant key, or fall back to DEFAULT_SCHOOLS"""
+    raw = DEFAULT_SCHOOLS
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+    return {key: SchoolConfig(key, **cfg) for key, cfg in raw.items()}
+
+
+class UnknownSchool(KeyError):
+    pass
+
+
+class SchoolRegistry:
+    """Loads each school on first request and evicts least-recently-used ones.
+
+    Loaded schools are kept in LRU order; after each load, the oldest are
+    dropped until the estimated total stays within memory_budget bytes. The
+    default school and the one just requested are never evicted. In-flight
+    requests keep their own reference, so eviction never pulls a KB out from
+    under a handler. on_load, if set, is called with each newly loaded school.
+    A KB embedded with a model other than embedding_model, or at a width
+    other than embedding_dimensions, fails to load, and static Q&A vectors
+    from another model are ignored, since neither can be compared with its
+    query vectors.
+    """
+
+    def __init__(self, configs: Dict[str, SchoolConfig], default: str = DEFAULT_SCHOOL,
+                 memory_budget: int = 1024 * 1024 * 1024, quantisation: str = "none",
+                 watch_interval: float = 0, embedding_model: Optional[str] = None,
+                 embedding_dimensions: Optional[int] = None):
+        if default not in configs:
+            raise ValueError(f"Default school {default!r} is not configured")
+        self.configs = configs
+        self.default = default
+        self.memory_budget = memory_budget
+        self.quantisation = quantisation
+        self.watch_interval = watch_interval
+        self.embedding_model = embedding_model
+        self.embedding_dimensions = embedding_dimensions
+        self._loaded: "OrderedDict[str, School]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {key: threading.Lock() for key in configs}
+        self.on_load: Optional[Callable[[School], None]] = None
+
+    def get(self, key: Optional[str] = None) -> School:
+        key = key or self.default
+        if key not in self.configs:
+            raise UnknownSchool(key)
+        with self._lock:
+            school = self._loaded.get(key)
+            if school is not None:
+                self._loaded.move_to_end(key)
+                return school
+        # Load outside the registry lock so other tenants keep being served
+        with self._load_locks[key]:
+            with self._lock:
+                school = self._loaded.get(key)
+            if school is None:
+                school = self._load(self.configs[key])
+                with self._lock:
+                    self._loaded[key] = school
+                    self._evict(keep=key)
+                if self.on_load is not None:
+                    self.on_load(school)
+        return school
+
+    def loaded(self) -> List[str]:
+        with self._lock:
+            return list(self._loaded)
+
+    def _load(self, config: SchoolConfig) -> School:
+        print(f"🏫 Loading school '{config.key}' from {config.kb_folder}")
+        holder = KnowledgeBaseHolder(config.kb_folder, quantisation=self.quantisation, model=self.embedding_model,
+                                     dimensions=self.embedding_dimensions)
+        if self.watch_interval > 0:
+            holder.watch(self.watch_interval)
+        static_qas = importlib.import_module(config.static_qa_module).STATIC_QA_LIST
+        prompts = dict(config.prompts)
+        if config.prompts_file and os.path.exists(config.prompts_file):
+            with open(config.prompts_file, "r", encoding="utf-8") as f:
+                prompts.update(json.load(f))
+        static_vectors = load_static_qa_vectors(config.kb_folder, static_qas, model=self.embedding_model)
+        return School(config, holder, static_qas, prompts, static_vectors)
+
+    def _evict(self, keep: str) -> None:
+        total = sum(s.memory_bytes() for s in self._loaded.values())
+        for key in list(self._loaded):
+            if total <= self.memory_budget:
+                break
+            if key in (keep, self.default):
+                continue
+            school = self._loaded.pop(key)
+            school.kb_holder.stop()
+            total -= school.memory_bytes()
+            print(f"🧹 Evicted school '{key}' to stay within the memory budget")
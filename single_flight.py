@@ -0,0 +1,117 @@
+# single_flight.py
+"""Let one caller at a time do the work for a key while the others wait for it"""
+
+import os
+import time
+import uuid
+import hashlib
+import threading
+from typing import Dict, Hashable, Optional
+
+from cache_backend import CacheBackend, shared_cache
+
+SINGLE_FLIGHT_TIMEOUT = float(os.getenv("SINGLE_FLIGHT_TIMEOUT", "30"))  # seconds a follower waits
+SINGLE_FLIGHT_POLL = 0.05  # seconds between checks on another worker's lease
+
+
+class SingleFlight:
+    """Coalesces concurrent work on the same key across threads and workers.
+
+    The first caller of lead(key) becomes the leader and must call
+    finish(key) when done, successful or not. Callers arriving meanwhile
+    block until then (or until timeout) and get False, after which they
+    read whatever the leader left behind, typically a cache entry. A
+    follower that gives up on a stuck leader simply does the work itself.
+
+    Threads of one process queue on an Event. Between processes, the
+    leader also holds a lease in the "flights" namespace of the shared
+    cache backend, which expires after timeout if the leader dies; the
+    first thread of another worker polls it until it is released. With
+    the in-process memory backend this only coalesces within the worker.
+    """
+
+    NAMESPACE = "flights"
+
+    def __init__(self, timeout: float = SINGLE_FLIGHT_TIMEOUT, backend: Optional[CacheBackend] = None):
+        self.timeout = timeout
+        self._backend = backend
+        self._flights: Dict[Hashable, threading.Event] = {}
+        self._leases: Dict[Hashable, bytes] = {}
+        self._lock = threading.Lock()
+        self.led = 0
+        self.coalesced = 0
+        self.timeouts = 0
+
+    @property
+    def backend(self) -> CacheBackend:
+        # Leases bypass a TieredCache's per-worker copy, which would hide a release
+        backend = self._backend or shared_cache()
+        return getattr(backend, "shared", backend)
+
+    @staticmethod
+    def _lease_key(key: Hashable) -> str:
+        return hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+
+    def _gave_up(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+        print(f"⏳ Gave up waiting {self.timeout:.0f}s for an in-flight answer")
+
+    def lead(self, key: Hashable) -> bool:
+        """True if the caller now leads key; otherwise wait for the leader and return False"""
+        with self._lock:
+            done = self._flights.get(key)
+            if done is None:
+                self._flights[key] = threading.Event()
+            else:
+                self.coalesced += 1
+        if done is not None:
+            if not done.wait(self.timeout):
+                self._gave_up()
+            return False
+
+        token = uuid.uuid4().bytes
+        lease_key = self._lease_key(key)
+        deadline = time.monotonic() + self.timeout
+        while not self.backend.add(self.NAMESPACE, lease_key, token, ttl=self.timeout):
+            if time.monotonic() > deadline:
+                self._gave_up()
+                break
+            time.sleep(SINGLE_FLIGHT_POLL)
+            if self.backend.get(self.NAMESPACE, lease_key) is None:
+                # Released by the other worker: its answer is in the cache for
+                # us and for the threads queued behind us here
+                with self._lock:
+                    self.coalesced += 1
+                break
+        else:
+            with self._lock:
+                self._leases[key] = token
+                self.led += 1
+            return True
+        self._release(key)
+        return False
+
+    def _release(self, key: Hashable) -> None:
+        with self._lock:
+            done = self._flights.pop(key, None)
+        if done is not None:
+            done.set()
+
+    def finish(self, key: Optional[Hashable]) -> None:
+        """Release the followers of key; a None key (not leading) is ignored"""
+        if key is None:
+            return
+        with self._lock:
+            token = self._leases.pop(key, None)
+        if token is not None:
+            lease_key = self._lease_key(key)
+            # An expired lease may have passed to another worker; leave theirs alone
+            if self.backend.get(self.NAMESPACE, lease_key) == token:
+                self.backend.delete(self.NAMESPACE, lease_key)
+        self._release(key)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"in_flight": len(self._flights), "led": self.led,
+                    "coalesced": self.coalesced, "timeouts": self.timeouts}
@@ -26,6 +26,7 @@
   let isPaused = false;
   let sessionId = null;
   let familyId = null;
+  let schoolId = new URLSearchParams(window.location.search).get('school') || null; // confirmed by /realtime/session
   let currentLang = headerLangSel?.value || 'en';
 
   // === Fallback watchdog ===
@@ -204,12 +205,14 @@
       body: JSON.stringify({
         model: 'gpt-4o-realtime-preview',
         voice: voiceByLang[currentLang] || 'shimmer',
-        language: currentLang
+        language: currentLang,
+        school: schoolId
       })
     });
     if (!sessRes.ok) throw new Error('Failed to create realtime session: ' + (await sessRes.text().catch(()=>'')));
     const sess = await sessRes.json();
     sessionId = sess.session_id;
+    schoolId = sess.school || schoolId; // tool calls must search the school the session was built for
 
     const token =
       sess.token ||
@@ -401,7 +404,9 @@ If the user asks about booking an open day, visiting the school, arranging a tou
       showIndicator('Checking dates…');
 
       try {
-        const response = await fetch('/api/emily/get-events');
+        const response = await fetch('/api/emily/get-events', {
+          headers: schoolId ? {'X-School-Id': schoolId} : {}
+        });
         const data = await response.json();
 
         const events = (data.events || []).filter(e => new Date(e.event_date) >= new Date());
@@ -496,7 +501,12 @@ If the user asks about booking an open day, visiting the school, arranging a tou
         const response = await fetch('/realtime/tool/kb_search', {
           method: 'POST',
           headers: {'Content-Type': 'application/json'},
-          body: JSON.stringify({ query: args.query })
+          body: JSON.stringify({
+            query: args.query,
+            source_prefix: args.source_prefix,
+            doc_type: args.doc_type,
+            school: schoolId
+          })
         });
 
         const result = await response.json();
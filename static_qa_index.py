@@ -0,0 +1,121 @@
+# static_qa_index.py
+"""Indexes over a school's static Q&A list: a hash for exact matches, character counts for fuzzy ones"""
+
+import unicodedata
+from collections import Counter
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def normalise_variant(text: str) -> str:
+    """NFKC, casefold, punctuation to spaces and whitespace collapsed.
+
+    "¿Cuánto cuesta?" and "cuánto cuesta" normalise alike, as do full- and
+    half-width forms ("学费？" / "学费?").
+    """
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = "".join(" " if unicodedata.category(ch).startswith("P") else ch for ch in text)
+    return " ".join(text.split())
+
+
+class StaticQAIndex:
+    """(language, normalised key or variant) -> Q&A entry.
+
+    Built once per school. As with the scan it replaces, the first entry
+    listing a variant wins; a variant listed by two entries is reported at
+    build time, as a conflict if their answers differ.
+    """
+
+    def __init__(self, qa_list: List[Dict[str, Any]], name: str = "static Q&A"):
+        self.entries: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        duplicates, conflicts = [], []
+        for qa in qa_list:
+            language = qa["language"]
+            for variant in [qa["key"]] + qa.get("variants", []):
+                slot = (language, normalise_variant(variant))
+                if not slot[1]:
+                    continue
+                owner = self.entries.setdefault(slot, qa)
+                if owner is qa:
+                    continue
+                found = (language, variant, owner["key"], qa["key"])
+                (duplicates if owner.get("answer") == qa.get("answer") else conflicts).append(found)
+        for language, variant, first, second in conflicts:
+            print(f"⚠️ {name}: '{variant}' ({language}) is a variant of both '{first}' and '{second}'; "
+                  f"'{first}' answers it")
+        if duplicates:
+            print(f"ℹ️ {name}: {len(duplicates)} variants repeated across entries with the same answer")
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def lookup(self, language: str, question: str) -> Optional[Dict[str, Any]]:
+        return self.entries.get((language, normalise_variant(question)))
+
+
+class FuzzyMatcher:
+    """Best difflib ratio of a question against the static Q&A variants.
+
+    Gives exactly what the loop it replaces gave: the first variant in list
+    order with the highest SequenceMatcher(None, question.lower(),
+    variant.lower()).ratio(). Rather than scoring every variant, it computes
+    quick_ratio(), an upper bound on ratio(), for all of them at once from
+    a per-language matrix of character counts, then scores variants in
+    descending bound order and stops once no bound can beat the best ratio
+    found. benchmark_fuzzy.py checks it against the full loop.
+    """
+
+    def __init__(self, qa_list: List[Dict[str, Any]]):
+        self._languages: Dict[str, Tuple[List[str], List[Dict[str, Any]], Dict[str, int], np.ndarray, np.ndarray]] = {}
+        grouped: Dict[str, Tuple[List[str], List[Dict[str, Any]]]] = {}
+        for qa in qa_list:
+            texts, entries = grouped.setdefault(qa["language"], ([], []))
+            for variant in [qa["key"]] + qa.get("variants", []):
+                texts.append(variant.lower())
+                entries.append(qa)
+        for language, (texts, entries) in grouped.items():
+            alphabet: Dict[str, int] = {}
+            for text in texts:
+                for ch in text:
+                    alphabet.setdefault(ch, len(alphabet))
+            counts = np.zeros((len(texts), len(alphabet)), dtype=np.int32)
+            for row, text in enumerate(texts):
+                for ch, n in Counter(text).items():
+                    counts[row, alphabet[ch]] = n
+            lengths = np.array([len(text) for text in texts], dtype=np.float64)
+            self._languages[language] = (texts, entries, alphabet, counts, lengths)
+
+    def best(self, language: str, question: str, min_score: float = 0.0) -> Tuple[Optional[Dict[str, Any]], float]:
+        """(entry, ratio) of the closest variant, or (None, best ratio) below min_score"""
+        text = question.lower()
+        if not text or language not in self._languages:
+            return None, 0.0
+        texts, entries, alphabet, counts, lengths = self._languages[language]
+        wanted = np.zeros(len(alphabet), dtype=np.int32)
+        for ch, n in Counter(text).items():
+            if ch in alphabet:
+                wanted[alphabet[ch]] = n
+        # quick_ratio() for every variant, computed as difflib does
+        bounds = 2.0 * np.minimum(counts, wanted).sum(axis=1) / (lengths + len(text))
+        order = np.lexsort((np.arange(len(texts)), -bounds))
+
+        # As in the old loop: the question is the first sequence (ratio()
+        # isn't symmetric), a ratio of 0 never matches and ties go to the
+        # earlier variant
+        matcher = SequenceMatcher(None, text)
+        best_i, best_score = -1, 0.0
+        for i in order:
+            bound = bounds[i]
+            if bound < best_score or bound == 0:
+                break
+            if bound == best_score and i > best_i:
+                continue
+            matcher.set_seq2(texts[i])
+            score = matcher.ratio()
+            if score > best_score or (score == best_score > 0 and i < best_i):
+                best_i, best_score = int(i), score
+        if best_i < 0 or best_score < min_score:
+            return None, best_score
+        return entries[best_i], best_score
@@ -0,0 +1,117 @@
+# static_qa_vectors.py
+"""Embedded static Q&A variants, so paraphrases of a curated question get its curated answer"""
+
+import os
+import json
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from knowledge_index import normalise_rows, _atomic_write, _save_npy
+from static_qa_index import normalise_variant
+
+STATIC_QA_VECTORS_FILE = "kb_static_qa_vectors.npy"
+STATIC_QA_META_FILE = "kb_static_qa_meta.json"
+STATIC_QA_SEMANTIC_THRESHOLD = float(os.getenv("STATIC_QA_SEMANTIC_THRESHOLD", "0.8"))  # cosine; tune per model
+STATIC_QA_SEMANTIC_MARGIN = float(os.getenv("STATIC_QA_SEMANTIC_MARGIN", "0.03"))  # over the best other entry
+
+
+def _rows(qa_list: List[Dict[str, Any]]) -> List[Tuple[str, str, Dict[str, Any]]]:
+    """(language, text, entry) for every distinct key and variant, grouped by language"""
+    rows, seen = [], set()
+    for language in sorted({qa["language"] for qa in qa_list}):
+        for qa in qa_list:
+            if qa["language"] != language:
+                continue
+            for variant in [qa["key"]] + qa.get("variants", []):
+                slot = (language, normalise_variant(variant))
+                if slot[1] and slot not in seen:
+                    seen.add(slot)
+                    rows.append((language, variant, qa))
+    return rows
+
+
+def _fingerprint(rows: List[Tuple[str, str, Dict[str, Any]]]) -> str:
+    raw = json.dumps([(language, text, qa["key"]) for language, text, qa in rows], ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class StaticQAVectors:
+    """One unit-length matrix per language over its keys and variants"""
+
+    def __init__(self, vectors: np.ndarray, rows: List[Tuple[str, str, Dict[str, Any]]], model: str,
+                 threshold: float = STATIC_QA_SEMANTIC_THRESHOLD, margin: float = STATIC_QA_SEMANTIC_MARGIN):
+        self.model = model
+        self.dim = vectors.shape[1]
+        self.threshold = threshold
+        self.margin = margin
+        self.languages: Dict[str, Tuple[np.ndarray, List[Dict[str, Any]]]] = {}
+        start = 0
+        while start < len(rows):
+            language = rows[start][0]
+            end = start
+            while end < len(rows) and rows[end][0] == language:
+                end += 1
+            # Rows are grouped by language, so each matrix is a view
+            self.languages[language] = (vectors[start:end], [qa for _, _, qa in rows[start:end]])
+            start = end
+
+    def match(self, language: str, q_vec: Optional[np.ndarray]) -> Tuple[Optional[Dict[str, Any]], float]:
+        """(entry, cosine) of the nearest variant if it is a confident match, else (None, cosine).
+
+        Confident means at least threshold, and ahead of the nearest variant
+        of any other entry by margin, so a question between two topics
+        ("scholarships or bursaries?") goes on to the RAG answer.
+        """
+        if q_vec is None or language not in self.languages or q_vec.shape[-1] != self.dim:
+            return None, 0.0
+        matrix, entries = self.languages[language]
+        scores = matrix @ normalise_rows(q_vec)
+        order = np.argsort(-scores)
+        best = entries[order[0]]
+        score = float(scores[order[0]])
+        runner_up = next((float(scores[i]) for i in order[1:] if entries[i]["key"] != best["key"]), -1.0)
+        if score < self.threshold or score - runner_up < self.margin:
+            return None, score
+        return best, score
+
+
+def build_static_qa_vectors(folder: str, qa_list: List[Dict[str, Any]], backend, batch: int = 256) -> StaticQAVectors:
+    """Embed every key and variant of qa_list with backend and write them to folder"""
+    rows = _rows(qa_list)
+    vectors = np.empty((len(rows), backend.dimensions), dtype=np.float32)
+    for start in range(0, len(rows), batch):
+        vectors[start:start + batch] = backend.embed([text for _, text, _ in rows[start:start + batch]])
+    vectors = normalise_rows(vectors)
+    _save_npy(os.path.join(folder, STATIC_QA_VECTORS_FILE), vectors)
+
+    def write_meta(path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"count": len(rows), "dim": vectors.shape[1], "model": backend.model,
+                       "fingerprint": _fingerprint(rows)}, f)
+
+    _atomic_write(os.path.join(folder, STATIC_QA_META_FILE), write_meta)
+    return StaticQAVectors(vectors, rows, backend.model)
+
+
+def load_static_qa_vectors(folder: str, qa_list: List[Dict[str, Any]],
+                           model: Optional[str] = None) -> Optional[StaticQAVectors]:
+    """Open the embedded variants, or None if not built, built with another
+    model or built from a different Q&A list"""
+    meta_path = os.path.join(folder, STATIC_QA_META_FILE)
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if model is not None and meta["model"] != model:
+        print(f"⚠️ Static Q&A vectors in {folder} were embedded with {meta['model']}, not {model}; "
+              "rebuild them with build_static_qa_vectors.py")
+        return None
+    rows = _rows(qa_list)
+    if meta["fingerprint"] != _fingerprint(rows):
+        print(f"⚠️ Static Q&A changed since its vectors in {folder} were built; "
+              "rebuild them with build_static_qa_vectors.py")
+        return None
+    vectors = np.load(os.path.join(folder, STATIC_QA_VECTORS_FILE), mmap_mode="r")
+    return StaticQAVectors(vectors, rows, meta["model"])
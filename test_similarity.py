@@ -6,6 +6,8 @@ from openai import OpenAI
 from dotenv import load_dotenv
 import os
 
+from knowledge_index import embedding_request
+
 # ─── Load OpenAI API key ─────────────────────────────
 load_dotenv()
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
@@ -18,16 +20,13 @@ print(f"✅ Loaded {len(chunks)} embedded chunks")
 
 # ─── Create Embedding for Test Question ───────────────
 query = "Who are the governors?"
-resp = client.embeddings.create(
-    model="text-embedding-3-small",
-    input=query
-)
+resp = client.embeddings.create(**embedding_request(query))
 q_vec = np.array(resp.data[0].embedding)
 
 # ─── Score Chunks by Similarity ───────────────────────
 scores = []
 for chunk in chunks:
-    c_vec = np.array(chunk["embedding"])
+    c_vec = np.array(chunk["embedding"])[:len(q_vec)]
     similarity = dot(q_vec, c_vec) / (norm(q_vec) * norm(c_vec))
     scores.append((similarity, chunk["source"], chunk["text"][:200]))
 
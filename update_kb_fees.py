@@ -91,6 +91,7 @@ if updated_count > 0:
     with open('kb_chunks/kb_chunks.pkl', 'wb') as f:
         pickle.dump(data, f)
     print("💾 Saved updated knowledge base")
+    print("   Run convert_kb_to_binary.py to refresh the memory-mapped KB files.")
 else:
     print("⚠️  No chunks were updated. The data structure might be different.")
     print("   You may need to manually inspect the pickle file structure.")